@@ -43,6 +43,7 @@ class DatabaseManager:
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS drawings (
                     id SERIAL PRIMARY KEY,
+                    drawing_id VARCHAR(36) UNIQUE,
                     user_id VARCHAR(100) NOT NULL,
                     title VARCHAR(200),
                     drawing_data TEXT,
@@ -50,6 +51,7 @@ class DatabaseManager:
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
                 )
             """)
+            cur.execute("ALTER TABLE drawings ADD COLUMN IF NOT EXISTS drawing_id VARCHAR(36) UNIQUE")
 
             # AI Training Data table
             cur.execute("""
@@ -129,14 +131,18 @@ class DatabaseManager:
 
     def save_user_data(self, user_id, user_data):
         """Save user data to database"""
+        return self.save_user_data_many({user_id: user_data})
+
+    def save_user_data_many(self, users):
+        """Save a batch of user records, given as a dict of user_id -> user data"""
         if not self.connection_pool:
-            return self._fallback_save_user_data(user_id, user_data)
+            return self._fallback_save_user_data_many(users)
 
         try:
             conn = self.connection_pool.getconn()
             cur = conn.cursor()
 
-            cur.execute("""
+            cur.executemany("""
                 INSERT INTO users (user_id, trial_count, trial_start_date, premium, premium_expiry, total_uses)
                 VALUES (%s, %s, %s, %s, %s, %s)
                 ON CONFLICT (user_id) DO UPDATE SET
@@ -145,21 +151,97 @@ class DatabaseManager:
                     premium = EXCLUDED.premium,
                     premium_expiry = EXCLUDED.premium_expiry,
                     total_uses = EXCLUDED.total_uses
-            """, (
+            """, [(
                 user_id,
                 user_data.get("trial_count", 0),
                 user_data.get("trial_start_date"),
                 user_data.get("premium", False),
                 user_data.get("premium_expiry"),
                 user_data.get("total_uses", 0)
-            ))
+            ) for user_id, user_data in users.items()])
 
             conn.commit()
             return True
 
         except Exception as e:
             print(f"Database save error: {e}")
-            return self._fallback_save_user_data(user_id, user_data)
+            return self._fallback_save_user_data_many(users)
+        finally:
+            if conn:
+                cur.close()
+                self.connection_pool.putconn(conn)
+
+    def save_drawing(self, user_id, drawing_id, title, drawing_data):
+        """Append one drawing's image data to the drawings store"""
+        if not self.connection_pool:
+            return self._fallback_save_drawing(user_id, drawing_id, title, drawing_data)
+
+        try:
+            conn = self.connection_pool.getconn()
+            cur = conn.cursor()
+
+            cur.execute("""
+                INSERT INTO drawings (drawing_id, user_id, title, drawing_data)
+                VALUES (%s, %s, %s, %s)
+            """, (drawing_id, user_id, title, drawing_data))
+
+            conn.commit()
+            return True
+
+        except Exception as e:
+            # Not written to the fallback file: with a database, drawings are only listed and read from the table
+            print(f"Drawing save error: {e}")
+            return False
+        finally:
+            if conn:
+                cur.close()
+                self.connection_pool.putconn(conn)
+
+    def get_drawings(self, user_id):
+        """List a user's drawings as {"id", "title", "created"} dicts, oldest first"""
+        if not self.connection_pool:
+            return None  # The JSON fallback keeps this list in the user record's saved_drawings
+
+        try:
+            conn = self.connection_pool.getconn()
+            cur = conn.cursor()
+
+            cur.execute("""
+                SELECT drawing_id, title, created_at FROM drawings
+                WHERE user_id = %s AND drawing_id IS NOT NULL
+                ORDER BY created_at, id
+            """, (user_id,))
+            return [
+                {"id": drawing_id, "title": title, "created": created_at.isoformat() if created_at else None}
+                for drawing_id, title, created_at in cur.fetchall()
+            ]
+
+        except Exception as e:
+            print(f"Drawing query error: {e}")
+            return None
+        finally:
+            if conn:
+                cur.close()
+                self.connection_pool.putconn(conn)
+
+    def get_drawing_data(self, user_id, drawing_ids):
+        """Get image data for a user's drawings, as a dict of drawing_id -> data"""
+        if not self.connection_pool:
+            return self._fallback_get_drawing_data(user_id, drawing_ids)
+
+        try:
+            conn = self.connection_pool.getconn()
+            cur = conn.cursor()
+
+            cur.execute("""
+                SELECT drawing_id, drawing_data FROM drawings
+                WHERE user_id = %s AND drawing_id = ANY(%s)
+            """, (user_id, list(drawing_ids)))
+            return dict(cur.fetchall())
+
+        except Exception as e:
+            print(f"Drawing query error: {e}")
+            return {}
         finally:
             if conn:
                 cur.close()
@@ -167,6 +249,10 @@ class DatabaseManager:
 
     def save_ai_training_data(self, user_id, prompt, response, rating, correction=None):
         """Save AI training data"""
+        return self.save_ai_training_data_many([(user_id, prompt, response, rating, correction)])
+
+    def save_ai_training_data_many(self, rows):
+        """Save a batch of (user_id, prompt, response, rating, correction) training rows"""
         if not self.connection_pool:
             return False
 
@@ -174,10 +260,11 @@ class DatabaseManager:
             conn = self.connection_pool.getconn()
             cur = conn.cursor()
 
-            cur.execute("""
+            cur.executemany("""
                 INSERT INTO ai_training_data (user_id, prompt, ai_response, user_rating, correction, session_id)
                 VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, prompt, response, rating, correction, str(uuid.uuid4())))
+            """, [(user_id, prompt, response, rating, correction, str(uuid.uuid4()))
+                  for user_id, prompt, response, rating, correction in rows])
 
             conn.commit()
             return True
@@ -213,6 +300,10 @@ class DatabaseManager:
 
     def _fallback_save_user_data(self, user_id, user_data):
         """Fallback to JSON file storage"""
+        return self._fallback_save_user_data_many({user_id: user_data})
+
+    def _fallback_save_user_data_many(self, users):
+        """Fallback to JSON file storage, reading and rewriting the file once per batch"""
         try:
             try:
                 with open("user_data.json", 'r') as f:
@@ -220,7 +311,7 @@ class DatabaseManager:
             except FileNotFoundError:
                 data = {}
 
-            data[user_id] = user_data
+            data.update(users)
 
             with open("user_data.json", 'w') as f:
                 json.dump(data, f, indent=2)
@@ -229,6 +320,39 @@ class DatabaseManager:
             print(f"Fallback save error: {e}")
             return False
 
+    def _fallback_save_drawing(self, user_id, drawing_id, title, drawing_data):
+        """Fallback to an append-only JSON lines file, one drawing per line"""
+        try:
+            line = json.dumps({"id": drawing_id, "user_id": user_id, "title": title, "data": drawing_data}) + "\n"
+            with open("drawings.jsonl", 'ab+') as f:
+                # A write cut short leaves the last line unterminated; start a fresh one so this drawing stays readable
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode())
+            return True
+        except Exception as e:
+            print(f"Fallback drawing save error: {e}")
+            return False
+
+    def _fallback_get_drawing_data(self, user_id, drawing_ids):
+        """Fallback to the JSON lines drawings file"""
+        wanted = set(drawing_ids)
+        found = {}
+        try:
+            with open("drawings.jsonl", 'r') as f:
+                for line in f:
+                    try:
+                        drawing = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by an interrupted write
+                    if drawing["id"] in wanted and drawing["user_id"] == user_id:
+                        found[drawing["id"]] = drawing["data"]
+        except FileNotFoundError:
+            pass
+        return found
+
     def create_user(self, user_id):
         """Create new user"""
         if not self.connection_pool:
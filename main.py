@@ -1,40 +1,170 @@
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 import openai
 import os
-import json
+import orjson
+import asyncio
+import copy
+import hashlib
+import heapq
+import math
 from datetime import datetime, timedelta
 import uuid
-from typing import Dict, List
-
-app = FastAPI()
+import re
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set, Union
+from dataclasses import dataclass
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import islice
+from string import Template
+from operator import itemgetter
+
+# Prefer libuv's event loop for cheaper socket I/O on the collaboration hot path
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson; the default response class for every endpoint"""
+    def render(self, content) -> bytes:
+        # Learning structures hold sets (e.g. related concepts); emit them as lists
+        return orjson.dumps(content, default=list, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+# Outbound frames buffered per peer before a lagging client is dropped
+OUTBOUND_QUEUE_SIZE = 256
+# Most queued drawing messages merged into a single outbound frame
+BROADCAST_BATCH_SIZE = 32
+# WebSocket subprotocol a client requests to receive text messages batched as JSON arrays;
+# peers that don't request it get one message per frame
+BATCH_SUBPROTOCOL = "drawing-batch.v1"
+# Training entries kept in memory; the full history lives in the database
+TRAINING_DATA_WINDOW = 5000
+# Successful responses kept for exact-prompt reuse, least recently used evicted first
+RESPONSE_CACHE_SIZE = 100
+# Most training rows written to the database in one batch
+PERSIST_BATCH_SIZE = 64
+# Co-occurring response words kept per concept once its related-concept counts are pruned
+RELATED_CONCEPTS_LIMIT = 64
+# Seconds a live API key check is trusted, and the shorter span a failed check is
+API_KEY_STATUS_TTL = 300
+API_KEY_FAILURE_TTL = 30
+# Seconds a loaded user record is reused before it is read from storage again, and how many are kept
+USER_DATA_TTL = 30
+USER_DATA_CACHE_SIZE = 1024
+# Seconds a computed /user-status body is served again, and how many users' bodies are kept
+USER_STATUS_TTL = 30
+USER_STATUS_CACHE_SIZE = 10000
+# Length of the free trial
+TRIAL_DAYS = 10
+# Seconds a saved user record may wait before the background writer stores it with others
+USER_WRITE_INTERVAL = 2
+# Seconds an OpenAI-generated /analyze suggestion is reused for the same request, and how many are kept
+SUGGESTION_CACHE_TTL = 6 * 3600
+SUGGESTION_CACHE_SIZE = 10000
+# Gallery page size by default, and the most drawings one page may hold
+GALLERY_PAGE_SIZE = 20
+GALLERY_PAGE_LIMIT = 100
+# Success patterns and past failures quoted in an adaptive-learning prompt
+LEARNING_CONTEXT_LIMIT = 5
+# Characters of training context quoted in a hybrid /analyze prompt
+HYBRID_CONTEXT_LIMIT = 2048
 
 # WebSocket connection manager for collaboration
 class CollaborationManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
         self.session_data: Dict[str, dict] = {}
+        self.outbound_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.writer_tasks: Dict[WebSocket, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket, session_id: str):
-        await websocket.accept()
-        if session_id not in self.active_connections:
-            self.active_connections[session_id] = []
-        self.active_connections[session_id].append(websocket)
+        batched = BATCH_SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+        await websocket.accept(subprotocol=BATCH_SUBPROTOCOL if batched else None)
+        self.active_connections.setdefault(session_id, set()).add(websocket)
+
+        # One writer per peer drains its queue, decoupling broadcasters from slow sockets
+        queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.outbound_queues[websocket] = queue
+        self.writer_tasks[websocket] = asyncio.create_task(self._writer(websocket, session_id, queue, batched))
 
     def disconnect(self, websocket: WebSocket, session_id: str):
-        if session_id in self.active_connections:
-            self.active_connections[session_id].remove(websocket)
+        connections = self.active_connections.get(session_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                # Forget empty sessions so abandoned session ids don't accumulate
+                del self.active_connections[session_id]
+
+        self.outbound_queues.pop(websocket, None)
+        writer = self.writer_tasks.pop(websocket, None)
+        if writer and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def _writer(self, websocket: WebSocket, session_id: str, queue: asyncio.Queue, batched: bool):
+        """Send queued messages to a single peer until its socket fails"""
+        pending = None
+        while True:
+            first = pending if pending is not None else await queue.get()
+            pending = None
+            try:
+                if isinstance(first, bytes):
+                    # Binary payloads are opaque (compressed strokes, image chunks), so each
+                    # is relayed as its own unmodified frame
+                    await websocket.send_bytes(first)
+                    continue
+                if not batched:
+                    await websocket.send_text(first)
+                    continue
+                batch = [first]
+                # Fold in whatever text queued up behind it so a burst of strokes costs one frame
+                while len(batch) < BROADCAST_BATCH_SIZE and not queue.empty():
+                    message = queue.get_nowait()
+                    if isinstance(message, bytes):
+                        # Binary messages can't share a text frame; send it next round
+                        pending = message
+                        break
+                    batch.append(message)
+                # Drawing text messages are JSON, so each frame is a JSON array of them
+                await websocket.send_text("[" + ",".join(batch) + "]")
+            except Exception:
+                # Remove dead connections
+                self.disconnect(websocket, session_id)
+                break
+
+    async def _close_lagging_peer(self, websocket: WebSocket):
+        """Close a peer that fell too far behind so its client can reconnect"""
+        try:
+            await websocket.close(code=1013)  # Try again later
+        except Exception:
+            pass
 
     async def broadcast_to_session(self, session_id: str, message: str):
-        if session_id in self.active_connections:
-            for connection in self.active_connections[session_id]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    # Remove dead connections
-                    self.active_connections[session_id].remove(connection)
+        self._enqueue_for_session(session_id, message)
+
+    async def broadcast_to_session_bytes(self, session_id: str, payload: bytes):
+        """Fan out an already-serialized payload; every peer shares the same bytes object"""
+        self._enqueue_for_session(session_id, payload)
+
+    def _enqueue_for_session(self, session_id: str, message):
+        # Snapshot peers so pruning below can't disturb the fan-out
+        for connection in list(self.active_connections.get(session_id, ())):
+            try:
+                self.outbound_queues[connection].put_nowait(message)
+            except asyncio.QueueFull:
+                # Drop the slow client rather than buffer for it without bound
+                self.disconnect(connection, session_id)
+                asyncio.create_task(self._close_lagging_peer(connection))
 
 collaboration_manager = CollaborationManager()
 
@@ -43,22 +173,615 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await collaboration_manager.connect(websocket, session_id)
     try:
         while True:
-            data = await websocket.receive_text()
-            # Broadcast drawing data to all participants in session
-            await collaboration_manager.broadcast_to_session(session_id, data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            # Broadcast drawing data to all participants in session; binary
+            # frames are relayed as-is without decoding or re-encoding
+            if message.get("bytes") is not None:
+                await collaboration_manager.broadcast_to_session_bytes(session_id, message["bytes"])
+            else:
+                await collaboration_manager.broadcast_to_session(session_id, message["text"])
     except WebSocketDisconnect:
         collaboration_manager.disconnect(websocket, session_id)
 
 # Initialize OpenAI client with enhanced configuration
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Client class -> (api key, client), shared by every OpenAI call so each client's connection pool is reused
+_openai_clients = {}
+_openai_client_lock = threading.Lock()
+
+def _shared_openai_client(client_class, api_key):
+    if api_key is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+    client_key, client = _openai_clients.get(client_class, (None, None))
+    if client is None or client_key != api_key:
+        with _openai_client_lock:
+            client_key, client = _openai_clients.get(client_class, (None, None))
+            if client is None or client_key != api_key:
+                client = client_class(api_key=api_key)
+                _openai_clients[client_class] = (api_key, client)
+    return client
+
+def _get_openai_client(api_key=None):
+    """Shared blocking OpenAI client for the configured key, rebuilt only when the key changes"""
+    return _shared_openai_client(openai.OpenAI, api_key)
+
+def _get_async_openai_client(api_key=None):
+    """Shared async OpenAI client, for handlers that must not block the event loop"""
+    return _shared_openai_client(openai.AsyncOpenAI, api_key)
+
+# Keyword vocabularies for the training classifiers, matched in one pass per text
+PROMPT_TYPE_KEYWORDS = {
+    'troubleshooting': ['help', 'problem', 'not working', 'error', 'issue'],
+    'drawing_instruction': ['draw', 'sketch', 'paint', 'create'],
+    'color_guidance': ['color', 'palette', 'shade'],
+    'educational': ['tutorial', 'how to', 'guide']
+}
+
+COMPLEXITY_INDICATORS = {
+    'basic': ['draw', 'color', 'simple', 'easy'],
+    'intermediate': ['composition', 'perspective', 'shading', 'technique'],
+    'advanced': ['style', 'artistic', 'professional', 'complex', 'advanced'],
+    'expert': ['masterpiece', 'photorealistic', 'virtuosic', 'experimental']
+}
+# Each match is one whitespace-delimited word containing at least one of the level's indicators
+COMPLEXITY_WORD_PATTERNS = {
+    level: re.compile(r"\S*(?:" + "|".join(map(re.escape, indicators)) + r")\S*")
+    for level, indicators in COMPLEXITY_INDICATORS.items()
+}
+
+ARTISTIC_TERMS = frozenset(['composition', 'balance', 'harmony', 'contrast', 'perspective',
+                            'technique', 'style', 'medium', 'texture', 'form', 'space'])
+
+CREATIVE_INDICATORS = frozenset([
+    'creative', 'unique', 'original', 'innovative', 'artistic', 'expressive',
+    'imaginative', 'experimental', 'stylized', 'abstract', 'conceptual'
+])
+
+SKILL_KEYWORDS = {
+    'beginner': ['first time', 'start', 'begin', 'basic', 'simple', 'easy', 'learn'],
+    'intermediate': ['improve', 'better', 'technique', 'practice', 'develop'],
+    'advanced': ['master', 'professional', 'expert', 'advanced', 'complex'],
+    'expert': ['virtuoso', 'masterpiece', 'photorealistic', 'highly detailed']
+}
+
+CONCEPT_CATEGORIES = {
+    'subjects': ['person', 'face', 'portrait', 'animal', 'cat', 'dog', 'tree', 'flower', 'house'],
+    'techniques': ['shading', 'blending', 'perspective', 'proportion', 'composition'],
+    'tools': ['pencil', 'brush', 'eraser', 'canvas', 'color', 'paint'],
+    'styles': ['realistic', 'cartoon', 'anime', 'abstract', 'impressionist'],
+    'elements': ['line', 'shape', 'form', 'color', 'texture', 'space', 'value']
+}
+
+LEARNING_OBJECTIVES = {
+    'skill_building': ['learn', 'practice', 'improve', 'develop', 'master'],
+    'problem_solving': ['help', 'fix', 'problem', 'issue', 'trouble', 'error'],
+    'creative_expression': ['create', 'design', 'artistic', 'expressive', 'original'],
+    'technical_mastery': ['technique', 'method', 'professional', 'advanced', 'precise']
+}
+
+LEARNING_MODALITIES = {
+    'visual': ['see', 'look', 'visual', 'image', 'picture', 'reference'],
+    'kinesthetic': ['draw', 'paint', 'sketch', 'create', 'make', 'practice'],
+    'auditory': ['explain', 'tell', 'describe', 'instruction', 'guide'],
+    'analytical': ['analyze', 'understand', 'theory', 'principle', 'concept']
+}
+
+CONTEXT_FACTORS = {
+    'time_sensitive': ['quick', 'fast', 'urgent', 'now', 'immediately'],
+    'environment': ['mobile', 'tablet', 'desktop', 'touchscreen'],
+    'purpose': ['homework', 'project', 'practice', 'fun', 'professional'],
+    'audience': ['beginner', 'student', 'artist', 'professional', 'child']
+}
+
+TRAINING_CATEGORIES = {
+    'geometric_construction': ['isometric', 'geometric', 'construction', 'polygon', 'hexagon', 'spiral'],
+    'mathematical_art': ['fibonacci', 'golden ratio', 'fractal', 'mandala', 'sacred geometry'],
+    'classical_techniques': ['chiaroscuro', 'sfumato', 'impasto', 'pointillism', 'atmospheric'],
+    'cultural_styles': ['chinese brush', 'japanese', 'islamic', 'celtic', 'aboriginal', 'medieval'],
+    'scientific_illustration': ['botanical', 'anatomical', 'technical', 'cutaway', 'medical'],
+    'digital_mastery': ['layer', 'blending', 'workflow', 'brush', 'digital painting'],
+    'pattern_systems': ['celtic knot', 'op art', 'art nouveau', 'decorative'],
+    'advanced_subjects': ['water reflection', 'architectural', 'mechanical', 'fabric', 'crystal']
+}
+
+TECHNIQUE_COMPLEXITY_LEVELS = {
+    'basic': 1,
+    'intermediate': 2,
+    'advanced': 3,
+    'expert': 4,
+    'professional': 5
+}
+EXPERT_TECHNIQUES = ['fibonacci', 'golden ratio', 'chiaroscuro', 'sfumato']
+ADVANCED_TECHNIQUES = ['perspective', 'composition', 'blending']
+
+CULTURAL_MARKERS = {
+    'chinese': ['chinese', 'brush painting', 'ink wash'],
+    'japanese': ['japanese', 'wave pattern', 'hokusai'],
+    'islamic': ['islamic', 'geometric star', 'arabesque'],
+    'celtic': ['celtic', 'knot', 'interlace'],
+    'medieval': ['illuminated', 'manuscript', 'gothic'],
+    'aboriginal': ['aboriginal', 'dot painting', 'dreamtime'],
+    'art_nouveau': ['art nouveau', 'mucha', 'organic forms']
+}
+
+MATH_PATTERNS = {
+    'fibonacci': 'fibonacci sequence and spiral construction',
+    'golden_ratio': 'golden ratio and divine proportion',
+    'fractals': 'fractal geometry and self-similarity',
+    'tessellation': 'geometric tessellation patterns',
+    'sacred_geometry': 'sacred geometric principles',
+    'symmetry': 'symmetrical pattern systems'
+}
+
+PROFESSIONAL_INDICATORS = frozenset([
+    'professional', 'master', 'expert', 'advanced technique',
+    'industry standard', 'portfolio quality', 'exhibition level'
+])
+
+ARTISTIC_MOVEMENTS = {
+    'renaissance': ['leonardo', 'michelangelo', 'sfumato', 'chiaroscuro'],
+    'impressionism': ['monet', 'pointillism', 'plein air', 'light study'],
+    'art_nouveau': ['mucha', 'klimt', 'organic', 'decorative'],
+    'modernism': ['picasso', 'abstract', 'cubism', 'experimental'],
+    'realism': ['photorealistic', 'accurate', 'detailed', 'lifelike']
+}
+
+SCIENTIFIC_TERMS = frozenset([
+    'anatomical', 'botanical', 'technical', 'precise', 'accurate',
+    'medical', 'scientific', 'measurement', 'proportion', 'structure'
+])
+
+# Keyword vocabularies for response-strategy detection
+LEARNING_INDICATORS = {
+    'tutorial_seeking': ['how to', 'tutorial', 'guide', 'step by step'],
+    'skill_building': ['practice', 'improve', 'better', 'learn'],
+    'problem_solving': ['help', 'stuck', 'difficulty', 'challenge'],
+    'exploration': ['try', 'experiment', 'explore', 'discover']
+}
+
+ARTISTIC_DOMAINS = {
+    'portrait': ['face', 'portrait', 'person', 'character'],
+    'landscape': ['landscape', 'scenery', 'nature', 'mountain', 'tree'],
+    'still_life': ['object', 'fruit', 'vase', 'table', 'arrangement'],
+    'abstract': ['abstract', 'non-representational', 'conceptual'],
+    'technical': ['diagram', 'blueprint', 'technical', 'mechanical'],
+    'fantasy': ['dragon', 'fantasy', 'mythical', 'magical'],
+    'anime': ['anime', 'manga', 'japanese style', 'cartoon']
+}
+
+ADVANCED_TECHNIQUE_CATEGORIES = {
+    'mathematical': ['fibonacci', 'golden ratio', 'fractal', 'sacred geometry'],
+    'classical': ['chiaroscuro', 'sfumato', 'impasto', 'atmospheric perspective'],
+    'cultural': ['mandala', 'celtic knot', 'chinese brush', 'japanese wave'],
+    'modern': ['pointillism', 'cubism', 'art nouveau', 'abstract'],
+    'technical': ['isometric', 'perspective', 'anatomical', 'architectural']
+}
+
+TROUBLESHOOTING_PATTERNS = {
+    'tool_issues': ['tool', 'brush', 'pencil', 'eraser', 'not working'],
+    'technical_problems': ['canvas', 'layer', 'color', 'save', 'load'],
+    'drawing_difficulties': ['proportions', 'perspective', 'shading', 'blending'],
+    'general_help': ['help', 'problem', 'issue', 'error', 'fix', 'trouble']
+}
+
+CREATIVE_REQUEST_INDICATORS = {
+    'original_creation': ['creative', 'unique', 'original', 'new', 'invent'],
+    'artistic_expression': ['artistic', 'expressive', 'emotional', 'mood'],
+    'experimental': ['experimental', 'abstract', 'unconventional', 'mixed'],
+    'stylistic': ['style', 'stylized', 'interpretation', 'version']
+}
+
+ART_CONCEPTS = {
+    'shape': ['circle', 'square', 'triangle', 'rectangle', 'oval'],
+    'technique': ['shading', 'blending', 'hatching', 'cross-hatch'],
+    'color': ['red', 'blue', 'green', 'yellow', 'purple', 'orange'],
+    'style': ['realistic', 'cartoon', 'anime', 'abstract', 'impressionist']
+}
+
+# One bit per ART_CONCEPTS category, so concept overlap is a popcount
+ART_CONCEPT_BITS = {term: 1 << bit for bit, terms in enumerate(ART_CONCEPTS.values()) for term in terms}
+
+# Whole-word markers counted in prompt tokens
+EMOTIONAL_WORDS = frozenset(['love', 'beautiful', 'amazing', 'inspire'])
+DETAIL_SEEKING_WORDS = frozenset(['detailed', 'realistic', 'accurate'])
+PERSONAL_WORDS = frozenset(['my', 'personal', 'own', 'custom'])
+CONJUNCTION_WORDS = frozenset(['and', 'with', 'plus', 'also'])
+DETAIL_REQUEST_WORDS = frozenset(['detailed', 'realistic', 'accurate', 'professional'])
+
+# Substrings marking a troubleshooting prompt as a commonly solved issue
+COMMON_ISSUE_KEYWORDS = frozenset(['tool', 'brush', 'canvas', 'color'])
+# Skill levels that stored troubleshooting answers are pitched at
+ENTRY_SKILL_LEVELS = frozenset(['beginner', 'intermediate'])
+# Training categories whose successful answers seed creative-request context
+CREATIVE_TRAINING_CATEGORIES = frozenset(['creative_breakthrough', 'narrative_art', 'style_development'])
+
+# Historical framing added to advanced-technique responses
+CULTURAL_CONTEXTS = {
+    'mathematical': {
+        'intro': "🔢 Mathematical art connects us to ancient wisdom:",
+        'history': "From Islamic geometric patterns to Renaissance golden ratio studies",
+        'modern': "Today's digital artists still use these timeless principles"
+    },
+    'classical': {
+        'intro': "🏛️ Classical techniques from the masters:",
+        'history': "Developed during Renaissance and Baroque periods",
+        'modern': "These methods remain essential for contemporary realism"
+    },
+    'cultural': {
+        'intro': "🌍 Cultural art forms carry deep meaning:",
+        'history': "Passed down through generations, each symbol tells a story",
+        'modern': "Respecting traditions while adding your personal voice"
+    }
+}
+
+# Step-by-step fixes per troubleshooting category
+TROUBLESHOOTING_TEMPLATES = {
+    'tool_issues': {
+        'intro': "🔧 Let's get your tools working perfectly!",
+        'steps': [
+            "1. Check tool selection (should be highlighted in blue)",
+            "2. Verify brush size is > 1 pixel",
+            "3. Ensure canvas is active (click on it once)",
+            "4. Try refreshing the page if issues persist"
+        ],
+        'outro': "💡 Pro tip: Save your work frequently to prevent data loss!"
+    },
+    'technical_problems': {
+        'intro': "⚡ Technical issues? Let's solve this step-by-step:",
+        'steps': [
+            "1. Check browser compatibility (Chrome/Firefox recommended)",
+            "2. Clear cache and reload the page",
+            "3. Disable browser extensions temporarily",
+            "4. Try incognito/private browsing mode"
+        ],
+        'outro': "🌐 If problems persist, try a different browser or device."
+    },
+    'drawing_difficulties': {
+        'intro': "🎨 Drawing challenges are part of the journey!",
+        'steps': [
+            "1. Break complex subjects into simple shapes",
+            "2. Use reference images for guidance",
+            "3. Practice the specific technique daily for 10 minutes",
+            "4. Don't aim for perfection - aim for progress"
+        ],
+        'outro': "🌟 Remember: Every expert was once a beginner. Keep practicing!"
+    }
+}
+
+# Rendered once, since the troubleshooting response does not depend on the prompt
+TROUBLESHOOTING_RESPONSES = {
+    category: f"{template['intro']}\n\n" + "".join(f"{step}\n" for step in template['steps']) + f"\n{template['outro']}"
+    for category, template in TROUBLESHOOTING_TEMPLATES.items()
+}
+
+# Three-stage study plans per skill level, in the order they are presented
+LEARNING_PATHS = {
+    'beginner': {
+        'foundations': ['Basic shapes', 'Line quality', 'Simple shading'],
+        'progression': ['Form and volume', 'Color basics', 'Composition'],
+        'next_level': ['Advanced techniques', 'Personal style', 'Complex subjects']
+    },
+    'intermediate': {
+        'strengthen': ['Perspective mastery', 'Advanced shading', 'Color harmony'],
+        'explore': ['New mediums', 'Different styles', 'Complex compositions'],
+        'challenge': ['Professional techniques', 'Personal projects', 'Teaching others']
+    },
+    'advanced': {
+        'refine': ['Master-level techniques', 'Artistic voice', 'Innovation'],
+        'expand': ['Cross-medium work', 'Concept development', 'Art business'],
+        'master': ['Teaching', 'Original research', 'Art leadership']
+    }
+}
+
+
+class KeywordScanner:
+    """Finds which of a fixed set of keywords occur in a text with a single regex pass"""
+
+    def __init__(self, keywords):
+        # Interned so scan results compare by identity against the keyword tables
+        keywords = {sys.intern(keyword) for keyword in keywords}
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        # A lookahead reports the longest keyword starting at every offset
+        self._pattern = re.compile("(?=(" + self._trie_pattern(trie) + "))")
+        # The reported keyword, plus the shorter keywords sharing its offset, which are its prefixes
+        self._matches = {
+            keyword: (keyword,) + tuple(other for other in keywords if other != keyword and keyword.startswith(other))
+            for keyword in keywords
+        }
+
+    @classmethod
+    def _trie_pattern(cls, node):
+        branches = [re.escape(char) + cls._trie_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + pattern + ")?" if "" in node else pattern
+
+    def scan(self, text):
+        """Return the set of keywords that occur as substrings of text"""
+        found = set()
+        for keyword in self._pattern.findall(text):
+            if keyword not in found:
+                found.update(self._matches[keyword])
+        return found
+
+
+def _keyword_vocabulary():
+    """Every keyword the training classifiers and strategy detection look for"""
+    vocabulary = set(ARTISTIC_TERMS | CREATIVE_INDICATORS | PROFESSIONAL_INDICATORS | SCIENTIFIC_TERMS)
+    vocabulary.update(TECHNIQUE_COMPLEXITY_LEVELS, EXPERT_TECHNIQUES, ADVANCED_TECHNIQUES)
+    for table in (PROMPT_TYPE_KEYWORDS, COMPLEXITY_INDICATORS, SKILL_KEYWORDS, CONCEPT_CATEGORIES,
+                  LEARNING_OBJECTIVES, LEARNING_MODALITIES, CONTEXT_FACTORS, TRAINING_CATEGORIES,
+                  CULTURAL_MARKERS, ARTISTIC_MOVEMENTS, LEARNING_INDICATORS, ARTISTIC_DOMAINS,
+                  ADVANCED_TECHNIQUE_CATEGORIES, TROUBLESHOOTING_PATTERNS, CREATIVE_REQUEST_INDICATORS,
+                  ART_CONCEPTS):
+        for keywords in table.values():
+            vocabulary.update(keywords)
+    vocabulary.update(COMMON_ISSUE_KEYWORDS)
+    for pattern in MATH_PATTERNS:
+        vocabulary.update(pattern.split('_'))
+    return vocabulary
+
+
+# Tables where the first matching category in declaration order wins, keyed by the result they produce
+FIRST_MATCH_TABLES = {
+    'prompt_type': PROMPT_TYPE_KEYWORDS,
+    'skill_level': SKILL_KEYWORDS,
+    'training_category': TRAINING_CATEGORIES,
+    'artistic_movement': ARTISTIC_MOVEMENTS,
+    'learning_context': LEARNING_INDICATORS,
+    'artistic_domain': ARTISTIC_DOMAINS,
+    'technique_category': ADVANCED_TECHNIQUE_CATEGORIES,
+    'troubleshooting_category': TROUBLESHOOTING_PATTERNS,
+    'creative_category': CREATIVE_REQUEST_INDICATORS
+}
+
+CATEGORY_NAMES = {table_name: list(table) for table_name, table in FIRST_MATCH_TABLES.items()}
+
+
+def _keyword_taxonomy():
+    """Map each keyword to (table name, category rank) for every first-match table it appears in"""
+    best_ranks = {}
+    for table_name, table in FIRST_MATCH_TABLES.items():
+        for rank, keywords in enumerate(table.values()):
+            for keyword in keywords:
+                best_ranks.setdefault(keyword, {}).setdefault(table_name, rank)
+    return {keyword: tuple(ranks.items()) for keyword, ranks in best_ranks.items()}
+
+
+KEYWORD_TAXONOMY = _keyword_taxonomy()
+
+
+def _rank_categories(keywords):
+    """Best category rank per first-match table among the scanned keywords, in one pass"""
+    ranks = {}
+    for keyword in keywords:
+        for table_name, rank in KEYWORD_TAXONOMY.get(keyword, ()):
+            if rank < ranks.get(table_name, rank + 1):
+                ranks[table_name] = rank
+    return ranks
+
+
+def _first_category(ranks, table_name, default):
+    """Name of the winning category for a table, or the default when no keyword matched"""
+    rank = ranks.get(table_name)
+    return default if rank is None else CATEGORY_NAMES[table_name][rank]
+
+
+def _word_bloom(words):
+    """64-bit Bloom filter of a word set; disjoint filters prove the sets share no word"""
+    bloom = 0
+    for word in words:
+        bloom |= 1 << (hash(word) & 63)
+    return bloom
+
+
+def _art_concept_mask(keywords):
+    """Bitmask of the ART_CONCEPTS categories whose terms appear among the scanned keywords"""
+    mask = 0
+    for keyword in keywords:
+        mask |= ART_CONCEPT_BITS.get(keyword, 0)
+    return mask
+
+
+@dataclass(slots=True, eq=False)
+class TrainingEntry:
+    """One analyzed interaction, with every classifier result stored as a flat field"""
+    timestamp: str
+    prompt: str
+    response: str
+    rating: int
+    correction: Optional[str]
+    response_time: Optional[float]
+    entry_id: int
+    session_id: Union[str, int]
+    prompt_type: str
+    response_quality: float
+    
+    # Advanced learning dimensions
+    complexity_level: str
+    complexity_value: int
+    complexity_scores: Dict[str, int]
+    prompt_concepts: int
+    response_concepts: int
+    artistic_vocabulary: int
+    depth_score: float
+    creativity_score: int
+    has_creative_elements: bool
+    innovation_level: float
+    skill_level_required: str
+    concept_categories: Dict[str, List[str]]
+    concept_signature: tuple  # Hashable form of concept_categories, for counting distinct combinations
+    learning_objectives: List[str]
+    active_modalities: List[str]
+    multimodal_score: int
+    is_multimodal: bool
+    contextual_relevance: Dict[str, List[str]]
+    
+    # Dataset-specific features
+    training_category: str
+    technique_complexity: int
+    cultural_context: List[str]
+    mathematical_elements: List[dict]
+    professional_level: str
+    artistic_movement: str
+    scientific_accuracy: str
+    
+    # Prompt words, and the subset long enough to carry meaning
+    prompt_tokens: frozenset
+    content_tokens: tuple
+    word_bloom: int
+    
+    # ART_CONCEPTS categories mentioned in the prompt, as ART_CONCEPT_BITS flags
+    concept_mask: int
+
+
+class StrategyDecision(Mapping):
+    """Read-only mapping returned by determine_response_strategy
+
+    Fields passed as keyword arguments are zero-argument callables, evaluated on
+    first read, so prompt text and diagnostics nobody reads are never built.
+    """
+    __slots__ = ('_values', '_deferred')
+
+    def __init__(self, values, **deferred):
+        self._values = values
+        self._deferred = deferred
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = self._deferred[key]()
+            del self._deferred[key]
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(list(self._values) + list(self._deferred))
+
+    def __len__(self):
+        return len(self._values) + len(self._deferred)
+
+
+# User-profile scores depend on a few user_info fields only, so they are memoized on those
+@lru_cache(maxsize=1024)
+def _user_skill_level(total_uses):
+    if total_uses < 5:
+        return "beginner"
+    elif total_uses < 20:
+        return "intermediate"
+    elif total_uses < 50:
+        return "advanced"
+    else:
+        return "expert"
+
+
+@lru_cache(maxsize=1024)
+def _personalization_score(total_uses, premium, has_saved_drawings):
+    return (
+        min(total_uses / 30, 0.4) +  # Usage history
+        (0.3 if premium else 0.1) +  # Premium status
+        (0.2 if has_saved_drawings else 0.0) +  # Has saved work
+        0.1  # Base personalization
+    )
+
+
+@lru_cache(maxsize=1024)
+def _session_context(total_uses, premium):
+    """Shared per key, so callers must treat the returned dict as read-only"""
+    return {
+        'session_length': min(total_uses, 10),
+        'is_returning_user': total_uses > 1,
+        'has_premium': premium,
+        'engagement_level': 'high' if total_uses > 5 else 'new'
+    }
+
+
+SKILL_MESSAGE_PREFIXES = {
+    'beginner': "Please provide step-by-step beginner guidance for: ",
+    'intermediate': "Help me improve my technique for: ",
+    'advanced': "Share advanced insights and techniques for: ",
+    'expert': "Discuss professional-level approaches to: "
+}
+
+SKILL_INSTRUCTIONS = {
+    'beginner': "Use simple language, provide step-by-step instructions, encourage experimentation without fear of mistakes.",
+    'intermediate': "Provide detailed techniques, suggest practice exercises, explain the 'why' behind methods.",
+    'advanced': "Share sophisticated techniques, discuss artistic theory, challenge with complex concepts.",
+    'expert': "Engage in professional-level discussion, share industry insights, focus on innovation and mastery."
+}
+
+TROUBLESHOOTING_SYSTEM_MESSAGE = """You are an expert technical support specialist for a digital drawing application.
+        Provide clear, step-by-step solutions for technical issues.
+        Include immediate fixes, common causes, and prevention tips.
+        Use HTML formatting with emojis for visual appeal."""
+
+HYBRID_SYSTEM_MESSAGE = """You are an expert drawing instructor with access to a comprehensive training database.
+        Combine the provided training examples with your knowledge to create the best possible response.
+        Build upon the training data while adding your own expertise and insights."""
+
+
+def _skill_message_affixes(skill_level, domain):
+    domain_context = f" in {domain} art" if domain != 'general' else ""
+    return sys.intern(SKILL_MESSAGE_PREFIXES.get(skill_level, "")), sys.intern(domain_context)
+
+
+# (prefix, suffix) wrapped around the user message for every skill level and detectable domain
+SKILL_MESSAGE_AFFIXES = {
+    (skill_level, domain): _skill_message_affixes(skill_level, domain)
+    for skill_level in SKILL_MESSAGE_PREFIXES
+    for domain in [*ARTISTIC_DOMAINS, 'general']
+}
+
+
+@lru_cache(maxsize=64)
+def _skill_adapted_system_message(skill_level, domain, feature_type):
+    system_msg = f"You are an expert art instructor. {SKILL_INSTRUCTIONS.get(skill_level, SKILL_INSTRUCTIONS['intermediate'])}"
+    
+    if domain != 'general':
+        system_msg += f" Specialize your advice for {domain} art."
+    
+    if feature_type == "premium":
+        system_msg += " Include professional tips and advanced techniques."
+    
+    return system_msg
+
+
+@lru_cache(maxsize=64)
+def _creative_system_message(feature_type):
+    base = """You are a creative drawing instructor who inspires artistic expression.
+        Encourage experimentation and provide multiple creative approaches."""
+    
+    if feature_type == "premium":
+        base += " Include advanced artistic techniques and professional insights."
+    
+    return base
+
+
+@lru_cache(maxsize=64)
+def _general_system_message(feature_type):
+    base = """You are an expert drawing instructor. Provide clear, step-by-step instructions."""
+    
+    if feature_type == "premium":
+        base += " Include advanced techniques and professional tips."
+    
+    return base
+
+
 # Advanced AI Training System
 class AITrainingSystem:
     def __init__(self):
-        self.training_data = []
+        self.training_data = deque(maxlen=TRAINING_DATA_WINDOW)
         self.model_feedback = {}
         self.user_corrections = {}
-        self.response_cache = {}
+        self.response_cache = OrderedDict()
         
         # Advanced learning components
         self.skill_progression_tracker = {}
@@ -66,8 +789,50 @@ class AITrainingSystem:
         self.learning_pathways = {}
         self.multi_modal_patterns = {}
         self.semantic_understanding = {}
+        
+        # Concept mastery map, rebuilt only after semantic_understanding has changed
+        self._concept_mastery_map = None
         self.difficulty_scaling = {}
         
+        # Monotonic id for each ingested entry; also orders the similarity index postings
+        self._next_entry_id = 0
+        
+        # Inverted index of successful prompts' words -> entry ids, for similarity search
+        self._prompt_index = {}
+        
+        # Successful entries by id, in arrival order; the only candidates for strategy matching
+        self._successful_entries = {}
+        
+        # Rendered creative-category examples among the successful entries, in arrival order,
+        # and the creative context built from the first three (None once those change)
+        self._creative_examples = {}
+        self._creative_context = None
+        
+        # One matcher for every classifier vocabulary, built once
+        self._keyword_scanner = KeywordScanner(_keyword_vocabulary())
+        
+        # Training rows waiting to be written to the database by the background flush task;
+        # the queue is created with the task so it belongs to the running event loop
+        self._persist_queue = None
+        self._persist_task = None
+        
+        # Running feedback aggregates, updated per entry so analysis never rescans training_data
+        self._positive_feedback_count = 0
+        self._negative_feedback_count = 0
+        self._prompt_type_counts = {}
+        self._success_word_counts = Counter()
+        self._failure_patterns = {}
+        self._failure_pattern_counts = Counter()
+        self._improvement_areas = deque()
+        
+        # Distinct concept signatures and training categories in the window, for the data quality score
+        self._concept_signature_counts = Counter()
+        self._training_category_counts = Counter()
+        
+        # Running sums behind the satisfaction score and the average improvement rate
+        self._rating_total = 0
+        self._improvement_rate_total = 0.0
+        
         # Comprehensive performance metrics
         self.performance_metrics = {
             "total_interactions": 0,
@@ -84,42 +849,86 @@ class AITrainingSystem:
             "personalization_accuracy": 0.0
         }
 
-    def collect_training_data(self, user_prompt, ai_response, user_rating, correction=None, response_time=None):
+    def collect_training_data(self, user_prompt, ai_response, user_rating, correction=None, response_time=None, session_id=None):
         """Collect comprehensive training data with advanced learning analysis"""
+        # Lowercase, tokenize and scan each text once; the classifiers below share the results
+        prompt_lower = user_prompt.lower().strip()
+        # Interned so the windowed token sets and the prompt index share one string per distinct word
+        prompt_tokens = [sys.intern(word) for word in prompt_lower.split()]
+        response_lower = ai_response.lower()
+        response_tokens = response_lower.split()
+        prompt_keywords = self._keyword_scanner.scan(prompt_lower)
+        response_keywords = self._keyword_scanner.scan(response_lower)
+        prompt_ranks = _rank_categories(prompt_keywords)
+        
+        complexity_level, complexity_value, complexity_scores = self._analyze_cognitive_complexity(prompt_lower, prompt_keywords)
+        prompt_concepts, response_concepts, artistic_vocabulary, depth_score = self._calculate_semantic_depth(
+            prompt_tokens, response_tokens, prompt_keywords, response_keywords
+        )
+        creativity_score, has_creative_elements, innovation_level = self._identify_creative_elements(prompt_keywords, response_keywords)
+        active_modalities, multimodal_score, is_multimodal = self._analyze_multimodal_aspects(prompt_keywords)
+        concept_categories = self._extract_concept_categories(prompt_keywords)
+        # Tokenize once at ingestion; similarity and pattern analysis reuse this set
+        prompt_token_set = frozenset(prompt_tokens)
+        entry_id = self._next_entry_id
+        self._next_entry_id += 1
+        
         # Enhanced training entry with multi-dimensional analysis
-        training_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "prompt": user_prompt.lower().strip(),
-            "response": ai_response,
-            "rating": user_rating,
-            "correction": correction,
-            "response_time": response_time,
-            "session_id": str(uuid.uuid4()),
-            "prompt_type": self._classify_prompt_type(user_prompt),
-            "response_quality": self._assess_response_quality(ai_response, user_rating),
+        training_entry = TrainingEntry(
+            timestamp=datetime.now().isoformat(),
+            prompt=prompt_lower,
+            response=ai_response,
+            rating=user_rating,
+            correction=correction,
+            response_time=response_time,
+            entry_id=entry_id,
+            # Entries without a known session are tracked on their own, as before
+            session_id=session_id if session_id is not None else entry_id,
+            prompt_type=self._classify_prompt_type(prompt_ranks),
+            response_quality=self._assess_response_quality(ai_response, user_rating, response_lower),
             
             # Advanced learning dimensions - Enhanced dataset feature handling
-            "cognitive_complexity": self._analyze_cognitive_complexity(user_prompt),
-            "semantic_depth": self._calculate_semantic_depth(user_prompt, ai_response),
-            "creative_elements": self._identify_creative_elements(user_prompt, ai_response),
-            "skill_level_required": self._determine_skill_level(user_prompt),
-            "concept_categories": self._extract_concept_categories(user_prompt),
-            "learning_objectives": self._identify_learning_objectives(user_prompt),
-            "multimodal_components": self._analyze_multimodal_aspects(user_prompt),
-            "contextual_relevance": self._assess_contextual_relevance(user_prompt),
+            complexity_level=complexity_level,
+            complexity_value=complexity_value,
+            complexity_scores=complexity_scores,
+            prompt_concepts=prompt_concepts,
+            response_concepts=response_concepts,
+            artistic_vocabulary=artistic_vocabulary,
+            depth_score=depth_score,
+            creativity_score=creativity_score,
+            has_creative_elements=has_creative_elements,
+            innovation_level=innovation_level,
+            skill_level_required=self._determine_skill_level(prompt_ranks),
+            concept_categories=concept_categories,
+            concept_signature=tuple((category, tuple(items)) for category, items in concept_categories.items()),
+            learning_objectives=self._identify_learning_objectives(prompt_keywords),
+            active_modalities=active_modalities,
+            multimodal_score=multimodal_score,
+            is_multimodal=is_multimodal,
+            contextual_relevance=self._assess_contextual_relevance(prompt_keywords),
             
             # Dataset-specific feature extraction
-            "training_category": self._identify_training_category(user_prompt, ai_response),
-            "technique_complexity": self._assess_technique_complexity(user_prompt),
-            "cultural_context": self._extract_cultural_context(user_prompt),
-            "mathematical_elements": self._identify_mathematical_patterns(user_prompt),
-            "professional_level": self._determine_professional_level(ai_response),
-            "artistic_movement": self._classify_artistic_movement(user_prompt),
-            "scientific_accuracy": self._assess_scientific_accuracy(ai_response)
-        }
+            training_category=self._identify_training_category(prompt_ranks, _rank_categories(response_keywords)),
+            technique_complexity=self._assess_technique_complexity(prompt_keywords),
+            cultural_context=self._extract_cultural_context(prompt_keywords),
+            mathematical_elements=self._identify_mathematical_patterns(prompt_keywords),
+            professional_level=self._determine_professional_level(ai_response, response_keywords),
+            artistic_movement=self._classify_artistic_movement(prompt_ranks),
+            scientific_accuracy=self._assess_scientific_accuracy(response_keywords),
+            
+            prompt_tokens=prompt_token_set,
+            # Words long enough to carry meaning, for the pattern and concept aggregations
+            content_tokens=tuple(word for word in prompt_token_set if len(word) > 3),
+            word_bloom=_word_bloom(prompt_token_set),
+            concept_mask=_art_concept_mask(prompt_keywords)
+        )
         
+        if len(self.training_data) == self.training_data.maxlen:
+            self._forget_entry(self.training_data[0])  # About to be evicted by append
         self.training_data.append(training_entry)
+        self._index_prompt(training_entry)
         self._update_performance_metrics(training_entry)
+        self._update_feedback_patterns(training_entry)
         
         # Advanced learning processes
         self._update_skill_progression(training_entry)
@@ -128,33 +937,70 @@ class AITrainingSystem:
         self._build_semantic_understanding(training_entry)
         self._adapt_difficulty_scaling(training_entry)
         
-        # Store in database for persistence
-        if hasattr(db_manager, 'save_ai_training_data'):
+        # Store in database for persistence, off the request path when the flush task is running
+        row = ("system", user_prompt, ai_response, user_rating, correction)
+        if self._persist_task is not None:
+            self._persist_queue.put_nowait(row)
+        else:
+            self._persist_rows([row])
+        
+        return training_entry
+
+    def _persist_rows(self, rows):
+        """Write a batch of training rows to the database"""
+        if hasattr(db_manager, 'save_ai_training_data_many'):
             try:
-                db_manager.save_ai_training_data(
-                    "system", user_prompt, ai_response, user_rating, correction
-                )
+                db_manager.save_ai_training_data_many(rows)
             except Exception as e:
                 print(f"Failed to save training data: {e}")
-        
-        return training_entry
 
-    def _classify_prompt_type(self, prompt):
+    async def _persist_loop(self):
+        """Drain queued training rows into the database in batches until the stop marker"""
+        while True:
+            batch = [await self._persist_queue.get()]
+            while len(batch) < PERSIST_BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self._persist_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            # Rows queued while this batch is written are picked up by the next one
+            if batch:
+                await asyncio.to_thread(self._persist_rows, batch)
+            if stopping:
+                return
+
+    def start_persistence(self):
+        """Start the background task that flushes training rows to the database"""
+        if self._persist_task is None:
+            self._persist_queue = asyncio.Queue()
+            self._persist_task = asyncio.create_task(self._persist_loop())
+
+    async def stop_persistence(self):
+        """Stop the flush task once everything queued so far is written"""
+        if self._persist_task is None:
+            return
+        # Queued behind the pending rows, so the task finishes its writes instead of being
+        # cancelled in the middle of one
+        self._persist_queue.put_nowait(None)
+        await self._persist_task
+        self._persist_task = None
+        
+        # Rows queued behind the marker are written here rather than dropped
+        pending = []
+        while not self._persist_queue.empty():
+            pending.append(self._persist_queue.get_nowait())
+        self._persist_queue = None
+        if pending:
+            self._persist_rows(pending)
+
+    def _classify_prompt_type(self, prompt_ranks):
         """Classify prompt type for better analysis"""
-        prompt_lower = prompt.lower()
-        
-        if any(word in prompt_lower for word in ['help', 'problem', 'not working', 'error', 'issue']):
-            return "troubleshooting"
-        elif any(word in prompt_lower for word in ['draw', 'sketch', 'paint', 'create']):
-            return "drawing_instruction"
-        elif any(word in prompt_lower for word in ['color', 'palette', 'shade']):
-            return "color_guidance"
-        elif any(word in prompt_lower for word in ['tutorial', 'how to', 'guide']):
-            return "educational"
-        else:
-            return "general"
+        return _first_category(prompt_ranks, 'prompt_type', "general")
 
-    def _assess_response_quality(self, response, rating):
+    def _assess_response_quality(self, response, rating, response_lower):
         """Assess response quality based on content and rating"""
         quality_score = rating if rating else 3
         
@@ -164,7 +1010,7 @@ class AITrainingSystem:
         elif len(response) > 1000:
             quality_score -= 0.3  # Too long
             
-        if "error" in response.lower() or "failed" in response.lower():
+        if "error" in response_lower or "failed" in response_lower:
             quality_score -= 1.0  # Error responses
             
         return max(1, min(5, quality_score))
@@ -173,14 +1019,13 @@ class AITrainingSystem:
         """Update system performance metrics"""
         self.performance_metrics["total_interactions"] += 1
         
-        if entry["rating"] >= 4:
+        if entry.rating >= 4:
             self.performance_metrics["successful_responses"] += 1
             
-        # Update satisfaction score (rolling average)
-        current_score = self.performance_metrics["user_satisfaction_score"]
+        # Update satisfaction score from the exact running total, so rounding never compounds
+        self._rating_total += entry.rating
         total = self.performance_metrics["total_interactions"]
-        new_score = ((current_score * (total - 1)) + entry["rating"]) / total
-        self.performance_metrics["user_satisfaction_score"] = round(new_score, 2)
+        self.performance_metrics["user_satisfaction_score"] = round(self._rating_total / total, 2)
 
     def fine_tune_responses(self, drawing_context, user_feedback):
         """Enhanced response generation based on collected feedback"""
@@ -207,24 +1052,52 @@ class AITrainingSystem:
         
         return enhanced_prompt
 
+    def _index_prompt(self, entry):
+        """Add a successful entry's prompt words to the inverted similarity index"""
+        if entry.rating < 4:  # Only successful responses are ever suggested
+            return
+        entry_id = entry.entry_id
+        self._successful_entries[entry_id] = entry
+        if entry.training_category in CREATIVE_TRAINING_CATEGORIES:
+            self._creative_examples[entry_id] = (
+                f"({entry.training_category}):\nChallenge: {entry.prompt}\nApproach: {entry.response[:150]}...\n\n"
+            )
+            if len(self._creative_examples) <= 3:
+                self._creative_context = None
+        for word in entry.prompt_tokens:
+            self._prompt_index.setdefault(word, deque()).append(entry_id)
+
+    def _indexed_overlaps(self, words):
+        """(shared word count, entry, entry word count) for successful entries sharing a word, oldest first"""
+        # Counting the posting lists of the prompt's words is a sparse intersection
+        # done in C by Counter, and entries sharing no word are never visited
+        overlaps = Counter()
+        for word in words:
+            postings = self._prompt_index.get(word)
+            if postings:
+                overlaps.update(postings)
+        entries = self._successful_entries
+        return [
+            (shared, entries[entry_id], len(entries[entry_id].prompt_tokens))
+            for entry_id, shared in sorted(overlaps.items())  # Insertion order keeps ties stable
+        ]
+
     def _find_similar_prompts(self, current_prompt, limit=3):
         """Find similar successful prompts for context"""
         current_words = set(current_prompt.lower().split())
-        similar_prompts = []
         
-        for entry in self.training_data:
-            if entry["rating"] >= 4:  # Only successful responses
-                entry_words = set(entry["prompt"].split())
-                similarity = len(current_words.intersection(entry_words)) / len(current_words.union(entry_words))
-                
-                if similarity > 0.3:  # 30% similarity threshold
-                    similar_prompts.append({
-                        "prompt": entry["prompt"],
-                        "response": entry["response"][:100] + "...",
-                        "similarity": similarity
-                    })
+        similar_prompts = []
+        for shared, entry, entry_size in self._indexed_overlaps(current_words):
+            similarity = shared / (len(current_words) + entry_size - shared)
+            
+            if similarity > 0.3:  # 30% similarity threshold
+                similar_prompts.append({
+                    "prompt": entry.prompt,
+                    "response": entry.response[:100] + "...",
+                    "similarity": similarity
+                })
         
-        return sorted(similar_prompts, key=lambda x: x["similarity"], reverse=True)[:limit]
+        return heapq.nlargest(limit, similar_prompts, key=itemgetter("similarity"))
 
     def _calculate_success_rate(self):
         """Calculate success rate percentage"""
@@ -235,48 +1108,90 @@ class AITrainingSystem:
              self.performance_metrics["total_interactions"]) * 100, 1
         )
 
+    def _update_feedback_patterns(self, entry):
+        """Fold a new entry into the running feedback aggregates"""
+        rating = entry.rating
+        
+        self._concept_signature_counts[entry.concept_signature] += 1
+        self._training_category_counts[entry.training_category] += 1
+        
+        prompt_type = entry.prompt_type
+        if prompt_type not in self._prompt_type_counts:
+            self._prompt_type_counts[prompt_type] = {"total": 0, "positive": 0}
+        self._prompt_type_counts[prompt_type]["total"] += 1
+        
+        if rating >= 4:
+            self._positive_feedback_count += 1
+            self._prompt_type_counts[prompt_type]["positive"] += 1
+            self._success_word_counts.update(entry.content_tokens)
+        elif rating <= 2:
+            self._negative_feedback_count += 1
+            if entry.correction:
+                self._failure_patterns[entry.prompt] = entry.correction
+                self._failure_pattern_counts[entry.prompt] += 1
+                self._improvement_areas.append(entry.correction)
+
+    def _forget_entry(self, entry):
+        """Remove the oldest in-memory entry from the prompt index and feedback aggregates"""
+        rating = entry.rating
+        
+        # An indexed oldest entry's postings are always at the front of their lists
+        if rating >= 4:
+            del self._successful_entries[entry.entry_id]
+            if self._creative_examples.pop(entry.entry_id, None) is not None:
+                self._creative_context = None  # The oldest example is always among the first three
+            for word in entry.prompt_tokens:
+                postings = self._prompt_index[word]
+                postings.popleft()
+                if not postings:
+                    del self._prompt_index[word]
+        
+        signature = entry.concept_signature
+        self._concept_signature_counts[signature] -= 1
+        if not self._concept_signature_counts[signature]:
+            del self._concept_signature_counts[signature]
+        self._training_category_counts[entry.training_category] -= 1
+        if not self._training_category_counts[entry.training_category]:
+            del self._training_category_counts[entry.training_category]
+        
+        prompt_type_counts = self._prompt_type_counts[entry.prompt_type]
+        prompt_type_counts["total"] -= 1
+        if not prompt_type_counts["total"]:
+            del self._prompt_type_counts[entry.prompt_type]
+        
+        if rating >= 4:
+            self._positive_feedback_count -= 1
+            prompt_type_counts["positive"] -= 1
+            for word in entry.content_tokens:
+                self._success_word_counts[word] -= 1
+                if not self._success_word_counts[word]:
+                    del self._success_word_counts[word]
+        elif rating <= 2:
+            self._negative_feedback_count -= 1
+            if entry.correction:
+                # A newer entry with the same prompt already holds the latest correction
+                self._failure_pattern_counts[entry.prompt] -= 1
+                if not self._failure_pattern_counts[entry.prompt]:
+                    del self._failure_pattern_counts[entry.prompt]
+                    del self._failure_patterns[entry.prompt]
+                self._improvement_areas.popleft()
+
     def analyze_feedback_patterns(self):
         """Comprehensive feedback pattern analysis"""
         if not self.training_data:
             return {"status": "No feedback data available"}
 
-        positive_feedback = [entry for entry in self.training_data if entry.get("rating", 0) >= 4]
-        negative_feedback = [entry for entry in self.training_data if entry.get("rating", 0) <= 2]
-        
-        # Analyze prompt types
-        prompt_type_performance = {}
-        for entry in self.training_data:
-            prompt_type = entry.get("prompt_type", "general")
-            if prompt_type not in prompt_type_performance:
-                prompt_type_performance[prompt_type] = {"total": 0, "positive": 0}
-            
-            prompt_type_performance[prompt_type]["total"] += 1
-            if entry.get("rating", 0) >= 4:
-                prompt_type_performance[prompt_type]["positive"] += 1
-
-        # Find common success patterns
-        success_patterns = {}
-        for entry in positive_feedback:
-            words = entry["prompt"].split()
-            for word in words:
-                if len(word) > 3:  # Skip short words
-                    success_patterns[word] = success_patterns.get(word, 0) + 1
-
-        # Find failure patterns
-        failure_patterns = {}
-        for entry in negative_feedback:
-            if entry.get("correction"):
-                failure_patterns[entry["prompt"]] = entry["correction"]
-
         return {
             "total_feedback": len(self.training_data),
-            "positive_feedback": len(positive_feedback),
-            "negative_feedback": len(negative_feedback),
+            "positive_feedback": self._positive_feedback_count,
+            "negative_feedback": self._negative_feedback_count,
             "success_rate": self._calculate_success_rate(),
-            "prompt_type_performance": prompt_type_performance,
-            "top_success_patterns": sorted(success_patterns.items(), key=lambda x: x[1], reverse=True)[:5],
-            "failure_patterns": failure_patterns,
-            "improvement_areas": [entry.get("correction") for entry in negative_feedback if entry.get("correction")],
+            "prompt_type_performance": {
+                prompt_type: dict(counts) for prompt_type, counts in self._prompt_type_counts.items()
+            },
+            "top_success_patterns": self._success_word_counts.most_common(5),
+            "failure_patterns": dict(self._failure_patterns),
+            "improvement_areas": list(self._improvement_areas),
             "performance_metrics": self.performance_metrics
         }
 
@@ -287,6 +1202,7 @@ class AITrainingSystem:
         # Check cache for similar prompts
         cache_key = user_prompt.lower().strip()
         if cache_key in self.response_cache:
+            self.response_cache.move_to_end(cache_key)
             cached_response = self.response_cache[cache_key]
             if cached_response["rating"] >= 4:
                 return cached_response["response"] + "<br><br>💡 <em>This suggestion was improved based on user feedback!</em>"
@@ -304,18 +1220,16 @@ class AITrainingSystem:
     def cache_successful_response(self, prompt, response, rating):
         """Cache successful responses for future use"""
         if rating >= 4:
-            self.response_cache[prompt.lower().strip()] = {
+            cache_key = prompt.lower().strip()
+            self.response_cache[cache_key] = {
                 "response": response,
-                "rating": rating,
-                "timestamp": datetime.now().isoformat()
+                "rating": rating
             }
+            self.response_cache.move_to_end(cache_key)
             
             # Keep cache size manageable
-            if len(self.response_cache) > 100:
-                # Remove oldest entries
-                sorted_cache = sorted(self.response_cache.items(), 
-                                    key=lambda x: x[1]["timestamp"])
-                self.response_cache = dict(sorted_cache[-80:])  # Keep 80 most recent
+            while len(self.response_cache) > RESPONSE_CACHE_SIZE:
+                self.response_cache.popitem(last=False)  # Least recently used
 
     def export_training_insights(self):
         """Export training insights for analysis"""
@@ -348,21 +1262,16 @@ class AITrainingSystem:
         
         return recommendations
 
-    def _analyze_cognitive_complexity(self, prompt):
+    def _analyze_cognitive_complexity(self, prompt_lower, prompt_keywords):
         """Analyze the cognitive complexity of the user's request"""
-        complexity_indicators = {
-            'basic': ['draw', 'color', 'simple', 'easy'],
-            'intermediate': ['composition', 'perspective', 'shading', 'technique'],
-            'advanced': ['style', 'artistic', 'professional', 'complex', 'advanced'],
-            'expert': ['masterpiece', 'photorealistic', 'virtuosic', 'experimental']
-        }
-        
-        prompt_words = prompt.lower().split()
         complexity_scores = {}
         
-        for level, indicators in complexity_indicators.items():
-            score = sum(1 for word in prompt_words if any(ind in word for ind in indicators))
-            complexity_scores[level] = score
+        for level, indicators in COMPLEXITY_INDICATORS.items():
+            # Only count matching words when the level's indicators occur in the prompt at all
+            if prompt_keywords.isdisjoint(indicators):
+                complexity_scores[level] = 0
+                continue
+            complexity_scores[level] = len(COMPLEXITY_WORD_PATTERNS[level].findall(prompt_lower))
         
         # Determine dominant complexity level
         max_level = max(complexity_scores, key=complexity_scores.get)
@@ -370,127 +1279,61 @@ class AITrainingSystem:
             'basic': 1, 'intermediate': 2, 'advanced': 3, 'expert': 4
         }.get(max_level, 1)
         
-        return {
-            'level': max_level,
-            'value': complexity_value,
-            'indicators_found': complexity_scores
-        }
+        return max_level, complexity_value, complexity_scores
 
-    def _calculate_semantic_depth(self, prompt, response):
+    def _calculate_semantic_depth(self, prompt_words, response_words, prompt_keywords, response_keywords):
         """Calculate semantic depth and meaning richness"""
-        prompt_concepts = len(set(prompt.lower().split()))
-        response_concepts = len(set(response.lower().split()))
+        prompt_concepts = len(set(prompt_words))
+        response_concepts = len(set(response_words))
         
         # Advanced semantic analysis
-        artistic_terms = ['composition', 'balance', 'harmony', 'contrast', 'perspective', 
-                         'technique', 'style', 'medium', 'texture', 'form', 'space']
+        semantic_richness = len(ARTISTIC_TERMS & (prompt_keywords | response_keywords))
         
-        semantic_richness = sum(1 for term in artistic_terms 
-                               if term in prompt.lower() or term in response.lower())
-        
-        return {
-            'prompt_concepts': prompt_concepts,
-            'response_concepts': response_concepts,
-            'artistic_vocabulary': semantic_richness,
-            'depth_score': (semantic_richness + response_concepts / 10) / 2
-        }
+        return prompt_concepts, response_concepts, semantic_richness, (semantic_richness + response_concepts / 10) / 2
 
-    def _identify_creative_elements(self, prompt, response):
+    def _identify_creative_elements(self, prompt_keywords, response_keywords):
         """Identify creative and innovative elements"""
-        creative_indicators = [
-            'creative', 'unique', 'original', 'innovative', 'artistic', 'expressive',
-            'imaginative', 'experimental', 'stylized', 'abstract', 'conceptual'
-        ]
+        creativity_score = len(CREATIVE_INDICATORS & (prompt_keywords | response_keywords))
         
-        creativity_score = sum(1 for indicator in creative_indicators 
-                              if indicator in prompt.lower() or indicator in response.lower())
-        
-        return {
-            'creativity_score': creativity_score,
-            'has_creative_elements': creativity_score > 0,
-            'innovation_level': min(creativity_score / 3, 1.0)
-        }
+        return creativity_score, creativity_score > 0, min(creativity_score / 3, 1.0)
 
-    def _determine_skill_level(self, prompt):
+    def _determine_skill_level(self, prompt_ranks):
         """Determine required skill level for the request"""
-        skill_keywords = {
-            'beginner': ['first time', 'start', 'begin', 'basic', 'simple', 'easy', 'learn'],
-            'intermediate': ['improve', 'better', 'technique', 'practice', 'develop'],
-            'advanced': ['master', 'professional', 'expert', 'advanced', 'complex'],
-            'expert': ['virtuoso', 'masterpiece', 'photorealistic', 'highly detailed']
-        }
-        
-        for level, keywords in skill_keywords.items():
-            if any(keyword in prompt.lower() for keyword in keywords):
-                return level
-        return 'intermediate'  # Default
+        return _first_category(prompt_ranks, 'skill_level', 'intermediate')  # Default
 
-    def _extract_concept_categories(self, prompt):
+    def _extract_concept_categories(self, prompt_keywords):
         """Extract and categorize artistic concepts"""
-        categories = {
-            'subjects': ['person', 'face', 'portrait', 'animal', 'cat', 'dog', 'tree', 'flower', 'house'],
-            'techniques': ['shading', 'blending', 'perspective', 'proportion', 'composition'],
-            'tools': ['pencil', 'brush', 'eraser', 'canvas', 'color', 'paint'],
-            'styles': ['realistic', 'cartoon', 'anime', 'abstract', 'impressionist'],
-            'elements': ['line', 'shape', 'form', 'color', 'texture', 'space', 'value']
-        }
-        
         found_categories = {}
-        for category, items in categories.items():
-            found_items = [item for item in items if item in prompt.lower()]
+        for category, items in CONCEPT_CATEGORIES.items():
+            found_items = [item for item in items if item in prompt_keywords]
             if found_items:
                 found_categories[category] = found_items
         
         return found_categories
 
-    def _identify_learning_objectives(self, prompt):
+    def _identify_learning_objectives(self, prompt_keywords):
         """Identify specific learning objectives from the prompt"""
-        objectives = {
-            'skill_building': ['learn', 'practice', 'improve', 'develop', 'master'],
-            'problem_solving': ['help', 'fix', 'problem', 'issue', 'trouble', 'error'],
-            'creative_expression': ['create', 'design', 'artistic', 'expressive', 'original'],
-            'technical_mastery': ['technique', 'method', 'professional', 'advanced', 'precise']
-        }
-        
         identified_objectives = []
-        for objective, keywords in objectives.items():
-            if any(keyword in prompt.lower() for keyword in keywords):
+        for objective, keywords in LEARNING_OBJECTIVES.items():
+            if not prompt_keywords.isdisjoint(keywords):
                 identified_objectives.append(objective)
         
         return identified_objectives
 
-    def _analyze_multimodal_aspects(self, prompt):
+    def _analyze_multimodal_aspects(self, prompt_keywords):
         """Analyze multimodal learning aspects"""
-        modalities = {
-            'visual': ['see', 'look', 'visual', 'image', 'picture', 'reference'],
-            'kinesthetic': ['draw', 'paint', 'sketch', 'create', 'make', 'practice'],
-            'auditory': ['explain', 'tell', 'describe', 'instruction', 'guide'],
-            'analytical': ['analyze', 'understand', 'theory', 'principle', 'concept']
-        }
-        
         active_modalities = []
-        for modality, indicators in modalities.items():
-            if any(indicator in prompt.lower() for indicator in indicators):
+        for modality, indicators in LEARNING_MODALITIES.items():
+            if not prompt_keywords.isdisjoint(indicators):
                 active_modalities.append(modality)
         
-        return {
-            'active_modalities': active_modalities,
-            'multimodal_score': len(active_modalities),
-            'is_multimodal': len(active_modalities) > 1
-        }
+        return active_modalities, len(active_modalities), len(active_modalities) > 1
 
-    def _assess_contextual_relevance(self, prompt):
+    def _assess_contextual_relevance(self, prompt_keywords):
         """Assess contextual relevance and situational factors"""
-        context_factors = {
-            'time_sensitive': ['quick', 'fast', 'urgent', 'now', 'immediately'],
-            'environment': ['mobile', 'tablet', 'desktop', 'touchscreen'],
-            'purpose': ['homework', 'project', 'practice', 'fun', 'professional'],
-            'audience': ['beginner', 'student', 'artist', 'professional', 'child']
-        }
-        
         context_data = {}
-        for factor, indicators in context_factors.items():
-            matching_indicators = [ind for ind in indicators if ind in prompt.lower()]
+        for factor, indicators in CONTEXT_FACTORS.items():
+            matching_indicators = [ind for ind in indicators if ind in prompt_keywords]
             if matching_indicators:
                 context_data[factor] = matching_indicators
         
@@ -498,8 +1341,8 @@ class AITrainingSystem:
 
     def _update_skill_progression(self, training_entry):
         """Track and update skill progression patterns"""
-        user_id = training_entry.get('session_id', 'anonymous')
-        skill_level = training_entry.get('skill_level_required', 'intermediate')
+        user_id = training_entry.session_id
+        skill_level = training_entry.skill_level_required
         
         if user_id not in self.skill_progression_tracker:
             self.skill_progression_tracker[user_id] = {
@@ -511,20 +1354,22 @@ class AITrainingSystem:
         
         user_progress = self.skill_progression_tracker[user_id]
         user_progress['progression_history'].append({
-            'timestamp': training_entry['timestamp'],
+            'timestamp': training_entry.timestamp,
             'skill_level': skill_level,
-            'rating': training_entry['rating'],
-            'concepts': training_entry.get('concept_categories', {})
+            'rating': training_entry.rating,
+            'concepts': training_entry.concept_categories
         })
         
         # Calculate improvement rate
         if len(user_progress['progression_history']) > 1:
             recent_ratings = [h['rating'] for h in user_progress['progression_history'][-5:]]
-            user_progress['improvement_rate'] = sum(recent_ratings) / len(recent_ratings)
+            improvement_rate = sum(recent_ratings) / len(recent_ratings)
+            self._improvement_rate_total += improvement_rate - user_progress['improvement_rate']
+            user_progress['improvement_rate'] = improvement_rate
 
     def _enhance_contextual_memory(self, training_entry):
         """Build contextual memory for better future responses"""
-        prompt_key = training_entry['prompt'][:50]  # First 50 chars as key
+        prompt_key = training_entry.prompt[:50]  # First 50 chars as key
         
         if prompt_key not in self.contextual_memory:
             self.contextual_memory[prompt_key] = {
@@ -536,23 +1381,23 @@ class AITrainingSystem:
         
         memory = self.contextual_memory[prompt_key]
         
-        if training_entry['rating'] >= 4:
+        if training_entry.rating >= 4:
             memory['successful_patterns'].append({
-                'response': training_entry['response'][:200],
-                'concepts': training_entry.get('concept_categories', {}),
-                'timestamp': training_entry['timestamp']
+                'response': training_entry.response[:200],
+                'concepts': training_entry.concept_categories,
+                'timestamp': training_entry.timestamp
             })
-        elif training_entry['rating'] <= 2:
+        elif training_entry.rating <= 2:
             memory['failed_patterns'].append({
-                'response': training_entry['response'][:200],
-                'correction': training_entry.get('correction'),
-                'timestamp': training_entry['timestamp']
+                'response': training_entry.response[:200],
+                'correction': training_entry.correction,
+                'timestamp': training_entry.timestamp
             })
 
     def _evolve_learning_pathways(self, training_entry):
         """Develop adaptive learning pathways"""
-        concepts = training_entry.get('concept_categories', {})
-        skill_level = training_entry.get('skill_level_required', 'intermediate')
+        concepts = training_entry.concept_categories
+        skill_level = training_entry.skill_level_required
         
         for category, items in concepts.items():
             pathway_key = f"{category}_{skill_level}"
@@ -567,43 +1412,46 @@ class AITrainingSystem:
             
             pathway = self.learning_pathways[pathway_key]
             
-            if training_entry['rating'] >= 4:
+            if training_entry.rating >= 4:
                 pathway['success_indicators'].extend(items)
-            elif training_entry['rating'] <= 2:
+            elif training_entry.rating <= 2:
                 pathway['common_obstacles'].extend(items)
 
     def _build_semantic_understanding(self, training_entry):
         """Build deeper semantic understanding of art concepts"""
-        prompt_words = set(training_entry['prompt'].split())
-        response_words = set(training_entry['response'].split())
+        prompt_words = training_entry.content_tokens
+        response_words = set(training_entry.response.split())
+        if prompt_words:
+            self._concept_mastery_map = None
         
         # Build concept relationships
         for word in prompt_words:
-            if len(word) > 3:  # Skip short words
-                if word not in self.semantic_understanding:
-                    self.semantic_understanding[word] = {
-                        'related_concepts': set(),
-                        'successful_associations': [],
-                        'usage_frequency': 0,
-                        'context_patterns': []
-                    }
-                
-                concept = self.semantic_understanding[word]
-                concept['usage_frequency'] += 1
-                concept['related_concepts'].update(response_words)
-                
-                if training_entry['rating'] >= 4:
-                    concept['successful_associations'].append({
-                        'response_snippet': training_entry['response'][:100],
-                        'rating': training_entry['rating']
-                    })
+            if word not in self.semantic_understanding:
+                self.semantic_understanding[word] = {
+                    'related_concepts': Counter(),
+                    'successful_associations': [],
+                    'usage_frequency': 0,
+                    'context_patterns': []
+                }
+            
+            concept = self.semantic_understanding[word]
+            concept['usage_frequency'] += 1
+            related = concept['related_concepts']
+            related.update(response_words)
+            # Prune in bulk so the cost of most_common is amortized across updates
+            if len(related) > 4 * RELATED_CONCEPTS_LIMIT:
+                concept['related_concepts'] = Counter(dict(related.most_common(RELATED_CONCEPTS_LIMIT)))
+            
+            if training_entry.rating >= 4:
+                concept['successful_associations'].append({
+                    'response_snippet': training_entry.response[:100],
+                    'rating': training_entry.rating
+                })
 
     def _adapt_difficulty_scaling(self, training_entry):
         """Adapt difficulty scaling based on user performance"""
-        complexity = training_entry.get('cognitive_complexity', {})
-        rating = training_entry['rating']
-        
-        complexity_level = complexity.get('level', 'basic')
+        rating = training_entry.rating
+        complexity_level = training_entry.complexity_level
         
         if complexity_level not in self.difficulty_scaling:
             self.difficulty_scaling[complexity_level] = {
@@ -651,13 +1499,15 @@ class AITrainingSystem:
         if not self.skill_progression_tracker:
             return progression_analysis
         
-        improvement_rates = [user['improvement_rate'] for user in self.skill_progression_tracker.values()]
-        progression_analysis['average_improvement_rate'] = sum(improvement_rates) / len(improvement_rates) if improvement_rates else 0.0
+        progression_analysis['average_improvement_rate'] = self._improvement_rate_total / len(self.skill_progression_tracker)
         
         return progression_analysis
 
     def _generate_concept_mastery_map(self):
         """Generate a concept mastery map showing learning relationships"""
+        if self._concept_mastery_map is not None:
+            return self._concept_mastery_map
+        
         mastery_map = {}
         
         for word, data in self.semantic_understanding.items():
@@ -667,99 +1517,53 @@ class AITrainingSystem:
             mastery_map[word] = {
                 'mastery_level': mastery_level,
                 'success_rate': success_rate,
-                'related_concepts': list(data['related_concepts'])[:5],  # Top 5
+                'related_concepts': [word for word, _ in data['related_concepts'].most_common(5)],  # Top 5
                 'learning_priority': (1 - mastery_level) * success_rate  # High if low mastery but high success
             }
         
+        self._concept_mastery_map = mastery_map
         return mastery_map
 
-    def _identify_training_category(self, prompt, response):
+    def _identify_training_category(self, prompt_ranks, response_ranks):
         """Identify specific training category from comprehensive dataset"""
-        categories = {
-            'geometric_construction': ['isometric', 'geometric', 'construction', 'polygon', 'hexagon', 'spiral'],
-            'mathematical_art': ['fibonacci', 'golden ratio', 'fractal', 'mandala', 'sacred geometry'],
-            'classical_techniques': ['chiaroscuro', 'sfumato', 'impasto', 'pointillism', 'atmospheric'],
-            'cultural_styles': ['chinese brush', 'japanese', 'islamic', 'celtic', 'aboriginal', 'medieval'],
-            'scientific_illustration': ['botanical', 'anatomical', 'technical', 'cutaway', 'medical'],
-            'digital_mastery': ['layer', 'blending', 'workflow', 'brush', 'digital painting'],
-            'pattern_systems': ['celtic knot', 'op art', 'art nouveau', 'decorative'],
-            'advanced_subjects': ['water reflection', 'architectural', 'mechanical', 'fabric', 'crystal']
-        }
-        
-        prompt_lower = prompt.lower()
-        response_lower = response.lower()
-        
-        for category, keywords in categories.items():
-            if any(keyword in prompt_lower or keyword in response_lower for keyword in keywords):
-                return category
-        return 'general'
+        # A category matches when either text mentions it, so the better of the two ranks wins
+        ranks = [r['training_category'] for r in (prompt_ranks, response_ranks) if 'training_category' in r]
+        return CATEGORY_NAMES['training_category'][min(ranks)] if ranks else 'general'
 
-    def _assess_technique_complexity(self, prompt):
+    def _assess_technique_complexity(self, prompt_keywords):
         """Assess technical complexity level of the request"""
-        complexity_indicators = {
-            'basic': 1,
-            'intermediate': 2, 
-            'advanced': 3,
-            'expert': 4,
-            'professional': 5
-        }
-        
-        for level, score in complexity_indicators.items():
-            if level in prompt.lower():
+        for level, score in TECHNIQUE_COMPLEXITY_LEVELS.items():
+            if level in prompt_keywords:
                 return score
         
         # Analyze by technique complexity
-        if any(word in prompt.lower() for word in ['fibonacci', 'golden ratio', 'chiaroscuro', 'sfumato']):
+        if not prompt_keywords.isdisjoint(EXPERT_TECHNIQUES):
             return 5  # Expert level
-        elif any(word in prompt.lower() for word in ['perspective', 'composition', 'blending']):
+        elif not prompt_keywords.isdisjoint(ADVANCED_TECHNIQUES):
             return 3  # Advanced
         else:
             return 2  # Intermediate default
 
-    def _extract_cultural_context(self, prompt):
+    def _extract_cultural_context(self, prompt_keywords):
         """Extract cultural and historical art context"""
-        cultural_markers = {
-            'chinese': ['chinese', 'brush painting', 'ink wash'],
-            'japanese': ['japanese', 'wave pattern', 'hokusai'],
-            'islamic': ['islamic', 'geometric star', 'arabesque'],
-            'celtic': ['celtic', 'knot', 'interlace'],
-            'medieval': ['illuminated', 'manuscript', 'gothic'],
-            'aboriginal': ['aboriginal', 'dot painting', 'dreamtime'],
-            'art_nouveau': ['art nouveau', 'mucha', 'organic forms']
-        }
-        
         found_cultures = []
-        for culture, markers in cultural_markers.items():
-            if any(marker in prompt.lower() for marker in markers):
+        for culture, markers in CULTURAL_MARKERS.items():
+            if not prompt_keywords.isdisjoint(markers):
                 found_cultures.append(culture)
         return found_cultures
 
-    def _identify_mathematical_patterns(self, prompt):
+    def _identify_mathematical_patterns(self, prompt_keywords):
         """Identify mathematical and geometric patterns"""
-        math_patterns = {
-            'fibonacci': 'fibonacci sequence and spiral construction',
-            'golden_ratio': 'golden ratio and divine proportion',
-            'fractals': 'fractal geometry and self-similarity',
-            'tessellation': 'geometric tessellation patterns',
-            'sacred_geometry': 'sacred geometric principles',
-            'symmetry': 'symmetrical pattern systems'
-        }
-        
         found_patterns = []
-        for pattern, description in math_patterns.items():
-            if any(keyword in prompt.lower() for keyword in pattern.split('_')):
+        for pattern, description in MATH_PATTERNS.items():
+            if not prompt_keywords.isdisjoint(pattern.split('_')):
                 found_patterns.append({'pattern': pattern, 'description': description})
         return found_patterns
 
-    def _determine_professional_level(self, response):
+    def _determine_professional_level(self, response, response_keywords):
         """Determine professional skill level indicated by response"""
-        professional_indicators = [
-            'professional', 'master', 'expert', 'advanced technique', 
-            'industry standard', 'portfolio quality', 'exhibition level'
-        ]
-        
         technical_depth = len([word for word in response.split() if len(word) > 8])
-        professional_terms = sum(1 for indicator in professional_indicators if indicator in response.lower())
+        professional_terms = len(PROFESSIONAL_INDICATORS & response_keywords)
         
         if professional_terms > 2 or technical_depth > 20:
             return 'professional'
@@ -768,29 +1572,13 @@ class AITrainingSystem:
         else:
             return 'intermediate'
 
-    def _classify_artistic_movement(self, prompt):
+    def _classify_artistic_movement(self, prompt_ranks):
         """Classify artistic movement or style referenced"""
-        movements = {
-            'renaissance': ['leonardo', 'michelangelo', 'sfumato', 'chiaroscuro'],
-            'impressionism': ['monet', 'pointillism', 'plein air', 'light study'],
-            'art_nouveau': ['mucha', 'klimt', 'organic', 'decorative'],
-            'modernism': ['picasso', 'abstract', 'cubism', 'experimental'],
-            'realism': ['photorealistic', 'accurate', 'detailed', 'lifelike']
-        }
-        
-        for movement, keywords in movements.items():
-            if any(keyword in prompt.lower() for keyword in keywords):
-                return movement
-        return 'contemporary'
+        return _first_category(prompt_ranks, 'artistic_movement', 'contemporary')
 
-    def _assess_scientific_accuracy(self, response):
+    def _assess_scientific_accuracy(self, response_keywords):
         """Assess scientific accuracy requirements of the response"""
-        scientific_terms = [
-            'anatomical', 'botanical', 'technical', 'precise', 'accurate',
-            'medical', 'scientific', 'measurement', 'proportion', 'structure'
-        ]
-        
-        accuracy_score = sum(1 for term in scientific_terms if term in response.lower())
+        accuracy_score = len(SCIENTIFIC_TERMS & response_keywords)
         
         if accuracy_score >= 3:
             return 'high_precision'
@@ -806,22 +1594,13 @@ class AITrainingSystem:
             
         total_entries = len(self.training_data)
         
-        # Basic completeness
-        complete_entries = sum(1 for entry in self.training_data 
-                             if all(key in entry for key in ["prompt", "response", "rating"]))
+        # Basic, advanced and dataset-specific completeness: every TrainingEntry carries all fields
+        complete_entries = advanced_complete = dataset_complete = total_entries
         
-        # Advanced completeness (including new learning dimensions)
-        advanced_complete = sum(1 for entry in self.training_data 
-                               if all(key in entry for key in ["cognitive_complexity", "semantic_depth", "concept_categories"]))
-        
-        # Dataset-specific completeness
-        dataset_complete = sum(1 for entry in self.training_data 
-                              if all(key in entry for key in ["training_category", "technique_complexity", "professional_level"]))
-        
-        # Quality indicators
-        high_quality_entries = sum(1 for entry in self.training_data if entry.get('rating', 0) >= 4)
-        diverse_concepts = len(set(str(entry.get('concept_categories', {})) for entry in self.training_data))
-        diverse_categories = len(set(entry.get('training_category', 'general') for entry in self.training_data))
+        # Quality indicators, read from the running aggregates
+        high_quality_entries = self._positive_feedback_count
+        diverse_concepts = len(self._concept_signature_counts)
+        diverse_categories = len(self._training_category_counts)
         
         quality_score = (
             (complete_entries / total_entries) * 0.25 +
@@ -834,9 +1613,18 @@ class AITrainingSystem:
         
         return round(quality_score, 1)
 
-    def determine_response_strategy(self, prompt, feature_type, user_info):
-        """Advanced immersive decision-making system with contextual intelligence"""
+    def determine_response_strategy(self, prompt, feature_type, user_info, is_premium=None):
+        """Advanced immersive decision-making system with contextual intelligence
+
+        Callers that have already read the user's premium flag pass it as is_premium.
+        """
+        if is_premium is None:
+            is_premium = user_info.get("premium", False)
         prompt_lower = prompt.lower().strip()
+        prompt_tokens = prompt_lower.split()
+        prompt_keywords = self._keyword_scanner.scan(prompt_lower)
+        prompt_ranks = _rank_categories(prompt_keywords)
+        word_counts = self._count_prompt_words(prompt_tokens)
         
         # Enhanced strategy decision factors with immersive context
         factors = {
@@ -847,55 +1635,70 @@ class AITrainingSystem:
             'is_creative_request': False,
             'training_data_confidence': 0.0,
             'prompt_complexity': 1,
+            'prompt_keywords': prompt_keywords,
             'user_skill_level': self._assess_user_skill_level(user_info),
-            'learning_context': self._analyze_learning_context(prompt_lower),
-            'artistic_domain': self._identify_artistic_domain(prompt_lower),
-            'immersion_factors': self._calculate_immersion_factors(prompt_lower, user_info),
-            'personalization_score': self._calculate_personalization_score(user_info),
-            'session_context': self._analyze_session_context(user_info)
+            'learning_context': self._analyze_learning_context(prompt_ranks),
+            'artistic_domain': self._identify_artistic_domain(prompt_ranks),
+            'immersion_factors': self._calculate_immersion_factors(prompt_tokens, word_counts, user_info),
+            'personalization_score': self._calculate_personalization_score(user_info, is_premium),
+            'session_context': self._analyze_session_context(user_info, is_premium),
+            'is_premium': is_premium
         }
         
         # Check for exact matches in training data with context awareness
-        for cached_prompt, cached_data in self.response_cache.items():
-            if cached_prompt == prompt_lower and cached_data["rating"] >= 4:
-                factors['has_exact_training_match'] = True
-                factors['training_data_confidence'] = 1.0
-                break
+        cached_data = self.response_cache.get(prompt_lower)
+        if cached_data is not None and cached_data["rating"] >= 4:
+            self.response_cache.move_to_end(prompt_lower)
+            factors['has_exact_training_match'] = True
+            factors['exact_match_entry'] = cached_data
+            factors['training_data_confidence'] = 1.0
         
         # Enhanced similarity matching with semantic understanding
         if not factors['has_exact_training_match']:
-            prompt_words = set(prompt_lower.split())
+            prompt_words = frozenset(prompt_tokens)
+            prompt_size = len(prompt_words)
+            prompt_bloom = _word_bloom(prompt_words)
+            prompt_concept_mask = _art_concept_mask(prompt_keywords)
             best_similarity = 0.0
             best_match = None
             semantic_matches = []
             
-            for entry in self.training_data:
-                if entry.get("rating", 0) >= 4:
-                    entry_words = set(entry["prompt"].split())
-                    if prompt_words and entry_words:
-                        # Basic word similarity
-                        word_similarity = len(prompt_words.intersection(entry_words)) / len(prompt_words.union(entry_words))
-                        
-                        # Semantic similarity bonus
-                        semantic_bonus = self._calculate_semantic_similarity(prompt_lower, entry["prompt"])
-                        
-                        # Context relevance bonus
-                        context_bonus = self._calculate_context_relevance(factors, entry)
-                        
-                        total_similarity = word_similarity + (semantic_bonus * 0.3) + (context_bonus * 0.2)
+            # Both bonuses depend on a few entry fields only, so each distinct value is scored once per request
+            semantic_bonuses = [self._calculate_semantic_similarity(prompt_concept_mask, concept_mask)
+                                for concept_mask in range(1 << len(ART_CONCEPTS))]
+            context_bonuses = {}
+            
+            # Entry word sets were built at ingestion, so Jaccard needs only the intersection
+            for entry in (self._successful_entries.values() if prompt_words else ()):
+                entry_words = entry.prompt_tokens
+                if entry_words:
+                    # Basic word similarity; the Bloom filters rule out most non-overlapping entries cheaply
+                    shared = len(prompt_words & entry_words) if prompt_bloom & entry.word_bloom else 0
+                    word_similarity = shared / (prompt_size + len(entry_words) - shared)
+                    
+                    # Semantic similarity bonus
+                    semantic_bonus = semantic_bonuses[entry.concept_mask]
+                    
+                    # Context relevance bonus
+                    context_key = (entry.skill_level_required, entry.training_category, entry.technique_complexity)
+                    context_bonus = context_bonuses.get(context_key)
+                    if context_bonus is None:
+                        context_bonus = context_bonuses[context_key] = self._calculate_context_relevance(factors, entry)
+                    
+                    total_similarity = word_similarity + (semantic_bonus * 0.3) + (context_bonus * 0.2)
+                    
+                    if total_similarity > best_similarity:
+                        best_similarity = total_similarity
+                        best_match = entry
                         
-                        if total_similarity > best_similarity:
-                            best_similarity = total_similarity
-                            best_match = entry
-                            
-                        if total_similarity > 0.3:
-                            semantic_matches.append({
-                                'entry': entry,
-                                'similarity': total_similarity,
-                                'word_sim': word_similarity,
-                                'semantic_sim': semantic_bonus,
-                                'context_sim': context_bonus
-                            })
+                    if total_similarity > 0.3:
+                        semantic_matches.append({
+                            'entry': entry,
+                            'similarity': total_similarity,
+                            'word_sim': word_similarity,
+                            'semantic_sim': semantic_bonus,
+                            'context_sim': context_bonus
+                        })
             
             if best_similarity > 0.3:  # Lowered threshold due to enhanced matching
                 factors['has_similar_training_match'] = True
@@ -903,59 +1706,28 @@ class AITrainingSystem:
                 factors['semantic_matches'] = semantic_matches[:5]  # Top 5 matches
         
         # Enhanced technique detection with cultural and style context
-        advanced_techniques = {
-            'mathematical': ['fibonacci', 'golden ratio', 'fractal', 'sacred geometry'],
-            'classical': ['chiaroscuro', 'sfumato', 'impasto', 'atmospheric perspective'],  
-            'cultural': ['mandala', 'celtic knot', 'chinese brush', 'japanese wave'],
-            'modern': ['pointillism', 'cubism', 'art nouveau', 'abstract'],
-            'technical': ['isometric', 'perspective', 'anatomical', 'architectural']
-        }
-        
-        factors['technique_category'] = None
-        for category, techniques in advanced_techniques.items():
-            if any(technique in prompt_lower for technique in techniques):
-                factors['is_advanced_technique'] = True
-                factors['technique_category'] = category
-                break
+        factors['technique_category'] = _first_category(prompt_ranks, 'technique_category', None)
+        if factors['technique_category'] is not None:
+            factors['is_advanced_technique'] = True
         
         # Enhanced troubleshooting detection with solution prediction
-        troubleshooting_patterns = {
-            'tool_issues': ['tool', 'brush', 'pencil', 'eraser', 'not working'],
-            'technical_problems': ['canvas', 'layer', 'color', 'save', 'load'],
-            'drawing_difficulties': ['proportions', 'perspective', 'shading', 'blending'],
-            'general_help': ['help', 'problem', 'issue', 'error', 'fix', 'trouble']
-        }
-        
-        factors['troubleshooting_category'] = None
-        for category, keywords in troubleshooting_patterns.items():
-            if any(keyword in prompt_lower for keyword in keywords):
-                factors['is_troubleshooting'] = True
-                factors['troubleshooting_category'] = category
-                break
+        factors['troubleshooting_category'] = _first_category(prompt_ranks, 'troubleshooting_category', None)
+        if factors['troubleshooting_category'] is not None:
+            factors['is_troubleshooting'] = True
         
         # Enhanced creative request detection with style analysis
-        creative_indicators = {
-            'original_creation': ['creative', 'unique', 'original', 'new', 'invent'],
-            'artistic_expression': ['artistic', 'expressive', 'emotional', 'mood'],
-            'experimental': ['experimental', 'abstract', 'unconventional', 'mixed'],
-            'stylistic': ['style', 'stylized', 'interpretation', 'version']
-        }
-        
-        factors['creative_category'] = None
-        for category, keywords in creative_indicators.items():
-            if any(keyword in prompt_lower for keyword in keywords):
-                factors['is_creative_request'] = True
-                factors['creative_category'] = category
-                break
+        factors['creative_category'] = _first_category(prompt_ranks, 'creative_category', None)
+        if factors['creative_category'] is not None:
+            factors['is_creative_request'] = True
         
         # Enhanced complexity assessment
-        complexity_indicators = {
-            'word_count': min(len(prompt_lower.split()) / 3, 2.0),
-            'technical_terms': len([w for w in prompt_lower.split() if len(w) > 8]) * 0.5,
-            'multiple_subjects': len([w for w in prompt_lower.split() if w in ['and', 'with', 'plus', 'also']]) * 0.3,
-            'detail_requests': len([w for w in prompt_lower.split() if w in ['detailed', 'realistic', 'accurate', 'professional']]) * 0.4
-        }
-        factors['prompt_complexity'] = min(sum(complexity_indicators.values()), 5.0)
+        prompt_complexity = (
+            min(len(prompt_tokens) / 3, 2.0) +  # Word count
+            word_counts['technical'] * 0.5 +  # Technical terms
+            word_counts['conjunction'] * 0.3 +  # Multiple subjects
+            word_counts['detail_request'] * 0.4  # Detail requests
+        )
+        factors['prompt_complexity'] = prompt_complexity if prompt_complexity < 5.0 else 5.0
         
         # Immersive Decision Logic with Enhanced Context
         return self._execute_immersive_decision_logic(factors, prompt_lower, feature_type, user_info)
@@ -965,25 +1737,23 @@ class AITrainingSystem:
         
         # Strategy 1: Perfect Training Match with Personalization
         if factors['has_exact_training_match']:
-            cached_response = None
-            for cached_prompt, cached_data in self.response_cache.items():
-                if cached_prompt == prompt_lower and cached_data["rating"] >= 4:
-                    cached_response = cached_data
-                    break
+            cached_response = factors['exact_match_entry']
             
             # Enhance with personalization
             enhanced_response = self._enhance_with_personalization(
                 cached_response["response"], factors, user_info
             )
             
-            return {
-                "strategy": "training_enhanced",
-                "response": enhanced_response,
-                "confidence": 1.0,
-                "reason": f"Perfect match with personalization for {factors['user_skill_level']} level",
-                "immersion_level": "high",
-                "context_applied": ["exact_match", "personalized", "skill_adapted"]
-            }
+            return StrategyDecision(
+                {
+                    "strategy": "training_enhanced",
+                    "response": enhanced_response,
+                    "confidence": 1.0,
+                    "immersion_level": "high"
+                },
+                reason=lambda: f"Perfect match with personalization for {factors['user_skill_level']} level",
+                context_applied=lambda: ["exact_match", "personalized", "skill_adapted"]
+            )
         
         # Strategy 2: Advanced Technique with Cultural Context
         elif factors['is_advanced_technique'] and factors['training_data_confidence'] > 0.25:
@@ -996,18 +1766,20 @@ class AITrainingSystem:
                     factors['artistic_domain']
                 )
                 
-                return {
-                    "strategy": "training_cultural",
-                    "response": contextual_response,
-                    "confidence": factors['training_data_confidence'],
-                    "reason": f"Advanced {factors['technique_category']} technique with cultural context",
-                    "immersion_level": "very_high",
-                    "context_applied": ["advanced_technique", "cultural_context", "historical_depth"]
-                }
+                return StrategyDecision(
+                    {
+                        "strategy": "training_cultural",
+                        "response": contextual_response,
+                        "confidence": factors['training_data_confidence'],
+                        "immersion_level": "very_high"
+                    },
+                    reason=lambda: f"Advanced {factors['technique_category']} technique with cultural context",
+                    context_applied=lambda: ["advanced_technique", "cultural_context", "historical_depth"]
+                )
         
         # Strategy 3: Intelligent Troubleshooting with Solution Path
         elif factors['is_troubleshooting']:
-            solution_confidence = self._assess_solution_confidence(factors, prompt_lower)
+            solution_confidence = self._assess_solution_confidence(factors)
             
             if solution_confidence > 0.7:
                 # Use training data for known solutions
@@ -1015,296 +1787,218 @@ class AITrainingSystem:
                     factors['troubleshooting_category'], prompt_lower, user_info
                 )
                 
-                return {
-                    "strategy": "training_troubleshooting",
-                    "response": troubleshooting_response,
-                    "confidence": solution_confidence,
-                    "reason": f"Known {factors['troubleshooting_category']} issue with guided solution",
-                    "immersion_level": "high",
-                    "context_applied": ["troubleshooting", "step_by_step", "user_guided"]
-                }
+                return StrategyDecision(
+                    {
+                        "strategy": "training_troubleshooting",
+                        "response": troubleshooting_response,
+                        "confidence": solution_confidence,
+                        "immersion_level": "high"
+                    },
+                    reason=lambda: f"Known {factors['troubleshooting_category']} issue with guided solution",
+                    context_applied=lambda: ["troubleshooting", "step_by_step", "user_guided"]
+                )
             else:
                 # Use OpenAI for novel issues
-                return {
-                    "strategy": "openai_troubleshooting",
-                    "system_message": self._get_enhanced_troubleshooting_system_message(factors),
-                    "user_message": f"TROUBLESHOOT {factors['troubleshooting_category']}: {prompt_lower}",
-                    "confidence": 0.8,
-                    "reason": "Novel troubleshooting requiring AI analysis",
-                    "immersion_level": "medium",
-                    "context_applied": ["ai_analysis", "problem_solving"]
-                }
+                return StrategyDecision(
+                    {
+                        "strategy": "openai_troubleshooting",
+                        "confidence": 0.8,
+                        "reason": "Novel troubleshooting requiring AI analysis",
+                        "immersion_level": "medium"
+                    },
+                    system_message=lambda: self._get_enhanced_troubleshooting_system_message(factors),
+                    user_message=lambda: f"TROUBLESHOOT {factors['troubleshooting_category']}: {prompt_lower}",
+                    context_applied=lambda: ["ai_analysis", "problem_solving"]
+                )
         
         # Strategy 4: Creative Expression with Style Guidance
         elif factors['is_creative_request'] or factors['prompt_complexity'] >= 3.5:
             if factors['personalization_score'] > 0.6:
                 # Personalized creative guidance
-                return {
-                    "strategy": "hybrid_creative",
-                    "system_message": self._get_personalized_creative_system_message(factors, feature_type),
-                    "user_message": prompt_lower,
-                    "training_context": self._get_creative_training_context(factors),
-                    "confidence": 0.9,
-                    "reason": f"Personalized creative guidance for {factors['creative_category']} expression",
-                    "immersion_level": "very_high",
-                    "context_applied": ["creative_expression", "personalized", "style_guidance"]
-                }
+                return StrategyDecision(
+                    {
+                        "strategy": "hybrid_creative",
+                        "user_message": prompt_lower,
+                        "confidence": 0.9,
+                        "immersion_level": "very_high"
+                    },
+                    system_message=lambda: self._get_personalized_creative_system_message(factors, feature_type),
+                    training_context=lambda: self._get_creative_training_context(factors),
+                    reason=lambda: f"Personalized creative guidance for {factors['creative_category']} expression",
+                    context_applied=lambda: ["creative_expression", "personalized", "style_guidance"]
+                )
             else:
                 # Standard creative response
-                return {
-                    "strategy": "openai_creative",
-                    "system_message": self._get_creative_system_message(feature_type),
-                    "user_message": prompt_lower,
-                    "confidence": 0.85,
-                    "reason": "Creative request requiring artistic flexibility",
-                    "immersion_level": "high",
-                    "context_applied": ["creative", "artistic_freedom"]
-                }
+                return StrategyDecision(
+                    {
+                        "strategy": "openai_creative",
+                        "user_message": prompt_lower,
+                        "confidence": 0.85,
+                        "reason": "Creative request requiring artistic flexibility",
+                        "immersion_level": "high"
+                    },
+                    system_message=lambda: self._get_creative_system_message(feature_type),
+                    context_applied=lambda: ["creative", "artistic_freedom"]
+                )
         
         # Strategy 5: Semantic Hybrid with Learning Path
         elif factors['has_similar_training_match'] and factors['training_data_confidence'] > 0.3:
             training_examples = factors.get('semantic_matches', [])[:3]
-            learning_path = self._generate_learning_path(factors, user_info)
             
-            return {
-                "strategy": "semantic_hybrid",
-                "system_message": self._get_semantic_hybrid_system_message(factors),
-                "training_context": self._format_semantic_training_context(training_examples),
-                "learning_path": learning_path,
-                "confidence": 0.88,
-                "reason": f"Semantic matching with {len(training_examples)} examples and learning path",
-                "immersion_level": "very_high",
-                "context_applied": ["semantic_matching", "learning_path", "skill_progression"]
-            }
+            return StrategyDecision(
+                {
+                    "strategy": "semantic_hybrid",
+                    "confidence": 0.88,
+                    "immersion_level": "very_high"
+                },
+                system_message=lambda: self._get_semantic_hybrid_system_message(factors),
+                training_context=lambda: self._format_semantic_training_context(training_examples),
+                learning_path=lambda: self._generate_learning_path(factors, user_info),
+                reason=lambda: f"Semantic matching with {len(training_examples)} examples and learning path",
+                context_applied=lambda: ["semantic_matching", "learning_path", "skill_progression"]
+            )
         
         # Strategy 6: Skill-Adapted General Response
         else:
-            skill_adapted_message = self._adapt_message_to_skill_level(
-                prompt_lower, factors['user_skill_level'], factors['artistic_domain']
+            return StrategyDecision(
+                {
+                    "strategy": "openai_skill_adapted",
+                    "confidence": 0.75,
+                    "immersion_level": "high"
+                },
+                system_message=lambda: self._get_skill_adapted_system_message(factors, feature_type),
+                user_message=lambda: self._adapt_message_to_skill_level(
+                    prompt_lower, factors['user_skill_level'], factors['artistic_domain']
+                ),
+                reason=lambda: f"Skill-adapted response for {factors['user_skill_level']} level",
+                context_applied=lambda: ["skill_adaptation", "domain_specific"]
             )
-            
-            return {
-                "strategy": "openai_skill_adapted",
-                "system_message": self._get_skill_adapted_system_message(factors, feature_type),
-                "user_message": skill_adapted_message,
-                "confidence": 0.75,
-                "reason": f"Skill-adapted response for {factors['user_skill_level']} level",
-                "immersion_level": "high",
-                "context_applied": ["skill_adaptation", "domain_specific"]
-            }
     
     def _assess_user_skill_level(self, user_info):
         """Assess user skill level from interaction history"""
-        total_uses = user_info.get("total_uses", 0)
-        
-        if total_uses < 5:
-            return "beginner"
-        elif total_uses < 20:
-            return "intermediate"  
-        elif total_uses < 50:
-            return "advanced"
-        else:
-            return "expert"
+        return _user_skill_level(user_info.get("total_uses", 0))
     
-    def _analyze_learning_context(self, prompt):
+    def _analyze_learning_context(self, prompt_ranks):
         """Analyze the learning context and objectives"""
-        learning_indicators = {
-            'tutorial_seeking': ['how to', 'tutorial', 'guide', 'step by step'],
-            'skill_building': ['practice', 'improve', 'better', 'learn'],
-            'problem_solving': ['help', 'stuck', 'difficulty', 'challenge'],
-            'exploration': ['try', 'experiment', 'explore', 'discover']
-        }
-        
-        for context, keywords in learning_indicators.items():
-            if any(keyword in prompt for keyword in keywords):
-                return context
-        return 'general_inquiry'
+        return _first_category(prompt_ranks, 'learning_context', 'general_inquiry')
     
-    def _identify_artistic_domain(self, prompt):
+    def _identify_artistic_domain(self, prompt_ranks):
         """Identify the specific artistic domain"""
-        domains = {
-            'portrait': ['face', 'portrait', 'person', 'character'],
-            'landscape': ['landscape', 'scenery', 'nature', 'mountain', 'tree'],
-            'still_life': ['object', 'fruit', 'vase', 'table', 'arrangement'],
-            'abstract': ['abstract', 'non-representational', 'conceptual'],
-            'technical': ['diagram', 'blueprint', 'technical', 'mechanical'],
-            'fantasy': ['dragon', 'fantasy', 'mythical', 'magical'],
-            'anime': ['anime', 'manga', 'japanese style', 'cartoon']
-        }
-        
-        for domain, keywords in domains.items():
-            if any(keyword in prompt for keyword in keywords):
-                return domain
-        return 'general'
+        return _first_category(prompt_ranks, 'artistic_domain', 'general')
+    
+    def _count_prompt_words(self, prompt_words):
+        """Count prompt words per marker set, and long technical words, in a single pass"""
+        counts = {'emotional': 0, 'detail_seeking': 0, 'personal': 0,
+                  'conjunction': 0, 'detail_request': 0, 'technical': 0}
+        for word in prompt_words:
+            if len(word) > 8:
+                counts['technical'] += 1
+            if word in EMOTIONAL_WORDS:
+                counts['emotional'] += 1
+            if word in DETAIL_SEEKING_WORDS:
+                counts['detail_seeking'] += 1
+            if word in PERSONAL_WORDS:
+                counts['personal'] += 1
+            if word in CONJUNCTION_WORDS:
+                counts['conjunction'] += 1
+            if word in DETAIL_REQUEST_WORDS:
+                counts['detail_request'] += 1
+        return counts
     
-    def _calculate_immersion_factors(self, prompt, user_info):
+    def _calculate_immersion_factors(self, prompt_words, word_counts, user_info):
         """Calculate factors that contribute to immersive experience"""
         return {
-            'emotional_engagement': len([w for w in prompt.split() if w in ['love', 'beautiful', 'amazing', 'inspire']]) * 0.2,
-            'detail_seeking': len([w for w in prompt.split() if w in ['detailed', 'realistic', 'accurate']]) * 0.3,
-            'personal_connection': len([w for w in prompt.split() if w in ['my', 'personal', 'own', 'custom']]) * 0.25,
-            'challenge_level': min(len(prompt.split()) / 10, 0.3),
+            'emotional_engagement': word_counts['emotional'] * 0.2,
+            'detail_seeking': word_counts['detail_seeking'] * 0.3,
+            'personal_connection': word_counts['personal'] * 0.25,
+            'challenge_level': min(len(prompt_words) / 10, 0.3),
             'user_engagement': min(user_info.get("total_uses", 0) / 20, 0.4)
         }
     
-    def _calculate_personalization_score(self, user_info):
+    def _calculate_personalization_score(self, user_info, is_premium):
         """Calculate how much personalization to apply"""
-        factors = [
-            min(user_info.get("total_uses", 0) / 30, 0.4),  # Usage history
-            0.3 if user_info.get("premium", False) else 0.1,  # Premium status
-            0.2 if user_info.get("saved_drawings") else 0.0,  # Has saved work
-            0.1  # Base personalization
-        ]
-        return sum(factors)
+        return _personalization_score(
+            user_info.get("total_uses", 0),
+            is_premium,
+            bool(user_info.get("saved_drawings"))
+        )
     
-    def _analyze_session_context(self, user_info):
+    def _analyze_session_context(self, user_info, is_premium):
         """Analyze the current session context"""
-        return {
-            'session_length': min(user_info.get("total_uses", 0), 10),
-            'is_returning_user': user_info.get("total_uses", 0) > 1,
-            'has_premium': user_info.get("premium", False),
-            'engagement_level': 'high' if user_info.get("total_uses", 0) > 5 else 'new'
-        }
+        return _session_context(user_info.get("total_uses", 0), is_premium)
     
-    def _calculate_semantic_similarity(self, prompt1, prompt2):
-        """Calculate semantic similarity between prompts"""
+    def _calculate_semantic_similarity(self, concept_mask1, concept_mask2):
+        """Calculate semantic similarity between prompts from their concept bitmasks"""
         # Simple semantic similarity based on shared concepts
-        art_concepts = {
-            'shape': ['circle', 'square', 'triangle', 'rectangle', 'oval'],
-            'technique': ['shading', 'blending', 'hatching', 'cross-hatch'],
-            'color': ['red', 'blue', 'green', 'yellow', 'purple', 'orange'],
-            'style': ['realistic', 'cartoon', 'anime', 'abstract', 'impressionist']
-        }
-        
-        concepts1 = set()
-        concepts2 = set()
-        
-        for concept_category, terms in art_concepts.items():
-            for term in terms:
-                if term in prompt1:
-                    concepts1.add(concept_category)
-                if term in prompt2:
-                    concepts2.add(concept_category)
-        
-        if not concepts1 or not concepts2:
+        if not concept_mask1 or not concept_mask2:
             return 0.0
             
-        return len(concepts1.intersection(concepts2)) / len(concepts1.union(concepts2))
+        return (concept_mask1 & concept_mask2).bit_count() / (concept_mask1 | concept_mask2).bit_count()
     
     def _calculate_context_relevance(self, factors, entry):
         """Calculate how relevant a training entry is to current context"""
         relevance_score = 0.0
         
         # Skill level relevance
-        entry_skill = entry.get('skill_level_required', 'intermediate')
-
-
+        entry_skill = entry.skill_level_required
+        if entry_skill == factors['user_skill_level']:
+            relevance_score += 0.3
+        
+        # Domain relevance  
+        entry_category = entry.training_category
+        if entry_category == factors['artistic_domain']:
+            relevance_score += 0.4
+            
+        # Technique relevance
+        if factors['is_advanced_technique'] and entry.technique_complexity >= 3:
+            relevance_score += 0.3
+            
+        return min(relevance_score, 1.0)
+    
     def _enhance_with_personalization(self, response, factors, user_info):
         """Enhance response with personalization based on user factors"""
+        if factors['personalization_score'] <= 0.6:
+            return response
+        
+        # High personalization
         skill_level = factors['user_skill_level']
-        personalization_score = factors['personalization_score']
+        user_name = "fellow artist"
+        if factors['is_premium']:
+            user_name = "creative professional"
         
-        if personalization_score > 0.6:
-            # High personalization
-            user_name = "fellow artist"
-            if user_info.get("premium"):
-                user_name = "creative professional"
-            
-            personalized_intro = f"🎨 Hey {user_name}! Based on your {skill_level} level experience, here's a tailored approach:\n\n"
-            
-            # Add skill-appropriate encouragement
-            if skill_level == "beginner":
-                encouragement = "\n\n🌟 Remember: Every master was once a beginner. You're doing great!"
-            elif skill_level == "intermediate":
-                encouragement = "\n\n💪 You're developing solid skills! Ready for the next challenge?"
-            else:
-                encouragement = "\n\n🚀 Your advanced skills show - time to push creative boundaries!"
-            
-            return personalized_intro + response + encouragement
+        personalized_intro = f"🎨 Hey {user_name}! Based on your {skill_level} level experience, here's a tailored approach:\n\n"
+        
+        # Add skill-appropriate encouragement
+        if skill_level == "beginner":
+            encouragement = "\n\n🌟 Remember: Every master was once a beginner. You're doing great!"
+        elif skill_level == "intermediate":
+            encouragement = "\n\n💪 You're developing solid skills! Ready for the next challenge?"
+        else:
+            encouragement = "\n\n🚀 Your advanced skills show - time to push creative boundaries!"
         
-        return response
+        return personalized_intro + response + encouragement
     
     def _add_cultural_context(self, response, technique_category, artistic_domain):
         """Add rich cultural and historical context to responses"""
-        cultural_contexts = {
-            'mathematical': {
-                'intro': "🔢 Mathematical art connects us to ancient wisdom:",
-                'history': "From Islamic geometric patterns to Renaissance golden ratio studies",
-                'modern': "Today's digital artists still use these timeless principles"
-            },
-            'classical': {
-                'intro': "🏛️ Classical techniques from the masters:",
-                'history': "Developed during Renaissance and Baroque periods",
-                'modern': "These methods remain essential for contemporary realism"
-            },
-            'cultural': {
-                'intro': "🌍 Cultural art forms carry deep meaning:",
-                'history': "Passed down through generations, each symbol tells a story",
-                'modern': "Respecting traditions while adding your personal voice"
-            }
-        }
-        
-        if technique_category in cultural_contexts:
-            context = cultural_contexts[technique_category]
-            enhanced_response = f"{context['intro']}\n\n{response}\n\n📚 **Cultural Note:** {context['history']}. {context['modern']}."
-            return enhanced_response
+        context = CULTURAL_CONTEXTS.get(technique_category)
+        if context is None:
+            return response
         
-        return response
+        return f"{context['intro']}\n\n{response}\n\n📚 **Cultural Note:** {context['history']}. {context['modern']}."
     
     def _generate_troubleshooting_response(self, troubleshooting_category, prompt, user_info):
         """Generate contextual troubleshooting response"""
-        troubleshooting_templates = {
-            'tool_issues': {
-                'intro': "🔧 Let's get your tools working perfectly!",
-                'steps': [
-                    "1. Check tool selection (should be highlighted in blue)",
-                    "2. Verify brush size is > 1 pixel",
-                    "3. Ensure canvas is active (click on it once)",
-                    "4. Try refreshing the page if issues persist"
-                ],
-                'outro': "💡 Pro tip: Save your work frequently to prevent data loss!"
-            },
-            'technical_problems': {
-                'intro': "⚡ Technical issues? Let's solve this step-by-step:",
-                'steps': [
-                    "1. Check browser compatibility (Chrome/Firefox recommended)",
-                    "2. Clear cache and reload the page",
-                    "3. Disable browser extensions temporarily",
-                    "4. Try incognito/private browsing mode"
-                ],
-                'outro': "🌐 If problems persist, try a different browser or device."
-            },
-            'drawing_difficulties': {
-                'intro': "🎨 Drawing challenges are part of the journey!",
-                'steps': [
-                    "1. Break complex subjects into simple shapes",
-                    "2. Use reference images for guidance",
-                    "3. Practice the specific technique daily for 10 minutes",
-                    "4. Don't aim for perfection - aim for progress"
-                ],
-                'outro': "🌟 Remember: Every expert was once a beginner. Keep practicing!"
-            }
-        }
-        
-        template = troubleshooting_templates.get(troubleshooting_category, troubleshooting_templates['tool_issues'])
-        
-        response = f"{template['intro']}\n\n"
-        for step in template['steps']:
-            response += f"{step}\n"
-        response += f"\n{template['outro']}"
-        
-        return response
+        return TROUBLESHOOTING_RESPONSES.get(troubleshooting_category, TROUBLESHOOTING_RESPONSES['tool_issues'])
     
-    def _assess_solution_confidence(self, factors, prompt):
+    def _assess_solution_confidence(self, factors):
         """Assess confidence in providing solution from training data"""
-        confidence_factors = {
-            'exact_match': 1.0 if factors['has_exact_training_match'] else 0.0,
-            'similar_match': factors['training_data_confidence'] * 0.8,
-            'common_issue': 0.7 if any(word in prompt for word in ['tool', 'brush', 'canvas', 'color']) else 0.0,
-            'skill_appropriate': 0.6 if factors['user_skill_level'] in ['beginner', 'intermediate'] else 0.3
-        }
-        
-        return min(sum(confidence_factors.values()), 1.0)
+        confidence = (
+            (1.0 if factors['has_exact_training_match'] else 0.0) +  # Exact match
+            factors['training_data_confidence'] * 0.8 +  # Similar match
+            (0.7 if not factors['prompt_keywords'].isdisjoint(COMMON_ISSUE_KEYWORDS) else 0.0) +  # Common issue
+            (0.6 if factors['user_skill_level'] in ENTRY_SKILL_LEVELS else 0.3)  # Skill appropriate
+        )
+        return confidence if confidence < 1.0 else 1.0
     
     def _get_enhanced_troubleshooting_system_message(self, factors):
         """Get enhanced system message for troubleshooting with context"""
@@ -1340,56 +2034,28 @@ class AITrainingSystem:
     
     def _get_creative_training_context(self, factors):
         """Get relevant training context for creative requests"""
-        creative_examples = []
-        
-        for entry in self.training_data:
-            if (entry.get('category') in ['creative_breakthrough', 'narrative_art', 'style_development'] and 
-                entry.get('rating', 0) >= 4):
-                creative_examples.append({
-                    'prompt': entry['prompt'],
-                    'approach': entry['response'][:150] + "...",
-                    'category': entry.get('category', 'creative')
-                })
-        
-        if creative_examples:
-            context = "Creative inspiration from successful examples:\n\n"
-            for i, example in enumerate(creative_examples[:3], 1):
-                context += f"Example {i} ({example['category']}):\n"
-                context += f"Challenge: {example['prompt']}\n"
-                context += f"Approach: {example['approach']}\n\n"
-            return context
+        if self._creative_context is None:
+            creative_examples = list(islice(self._creative_examples.values(), 3))
+            if creative_examples:
+                self._creative_context = "Creative inspiration from successful examples:\n\n" + "".join(
+                    f"Example {i} {example}" for i, example in enumerate(creative_examples, 1)
+                )
+            else:
+                self._creative_context = "Draw inspiration from your creative vision and artistic intuition."
         
-        return "Draw inspiration from your creative vision and artistic intuition."
+        return self._creative_context
     
     def _generate_learning_path(self, factors, user_info):
         """Generate personalized learning path"""
         skill_level = factors['user_skill_level']
         domain = factors['artistic_domain']
         
-        learning_paths = {
-            'beginner': {
-                'foundations': ['Basic shapes', 'Line quality', 'Simple shading'],
-                'progression': ['Form and volume', 'Color basics', 'Composition'],
-                'next_level': ['Advanced techniques', 'Personal style', 'Complex subjects']
-            },
-            'intermediate': {
-                'strengthen': ['Perspective mastery', 'Advanced shading', 'Color harmony'],
-                'explore': ['New mediums', 'Different styles', 'Complex compositions'],
-                'challenge': ['Professional techniques', 'Personal projects', 'Teaching others']
-            },
-            'advanced': {
-                'refine': ['Master-level techniques', 'Artistic voice', 'Innovation'],
-                'expand': ['Cross-medium work', 'Concept development', 'Art business'],
-                'master': ['Teaching', 'Original research', 'Art leadership']
-            }
-        }
-        
-        path = learning_paths.get(skill_level, learning_paths['intermediate'])
+        current_focus, next_goals, long_term = LEARNING_PATHS.get(skill_level, LEARNING_PATHS['intermediate']).values()
         
         return {
-            'current_focus': path[list(path.keys())[0]],
-            'next_goals': path[list(path.keys())[1]] if len(path) > 1 else [],
-            'long_term': path[list(path.keys())[2]] if len(path) > 2 else [],
+            'current_focus': list(current_focus),
+            'next_goals': list(next_goals),
+            'long_term': list(long_term),
             'personalized_note': f"Tailored for {skill_level} level in {domain} art"
         }
     
@@ -1414,145 +2080,131 @@ class AITrainingSystem:
         if not semantic_matches:
             return "No relevant training examples found."
         
-        context = "Relevant training examples (with similarity analysis):\n\n"
+        parts = ["Relevant training examples (with similarity analysis):\n\n"]
         
         for i, match in enumerate(semantic_matches, 1):
             entry = match['entry']
-            similarities = {
-                'Word Match': f"{match['word_sim']:.2f}",
-                'Semantic': f"{match['semantic_sim']:.2f}",
-                'Context': f"{match['context_sim']:.2f}",
-                'Total': f"{match['similarity']:.2f}"
-            }
+            total = f"{match['similarity']:.2f}"
+            # Written out as the repr of the {label: score} dict the prompt has always shown
+            similarities = (
+                f"{{'Word Match': '{match['word_sim']:.2f}', 'Semantic': '{match['semantic_sim']:.2f}', "
+                f"'Context': '{match['context_sim']:.2f}', 'Total': '{total}'}}"
+            )
             
-            context += f"Example {i} (Similarity: {similarities['Total']}):\n"
-            context += f"Q: {entry['prompt']}\n"
-            context += f"A: {entry['response'][:200]}...\n"
-            context += f"Similarities: {similarities}\n\n"
+            parts.append(
+                f"Example {i} (Similarity: {total}):\n"
+                f"Q: {entry.prompt}\n"
+                f"A: {entry.response[:200]}...\n"
+                f"Similarities: {similarities}\n\n"
+            )
         
-        return context
+        return "".join(parts)
     
     def _adapt_message_to_skill_level(self, prompt, skill_level, domain):
         """Adapt the user message based on skill level and domain"""
-        skill_adaptations = {
-            'beginner': "Please provide step-by-step beginner guidance for: ",
-            'intermediate': "Help me improve my technique for: ",
-            'advanced': "Share advanced insights and techniques for: ",
-            'expert': "Discuss professional-level approaches to: "
-        }
-        
-        domain_context = f" in {domain} art" if domain != 'general' else ""
-        
-        adapted_prompt = skill_adaptations.get(skill_level, "") + prompt + domain_context
-        return adapted_prompt
+        affixes = SKILL_MESSAGE_AFFIXES.get((skill_level, domain))
+        prefix, domain_context = affixes if affixes is not None else _skill_message_affixes(skill_level, domain)
+        return f"{prefix}{prompt}{domain_context}"
     
     def _get_skill_adapted_system_message(self, factors, feature_type):
         """Get skill-adapted system message"""
-        skill_level = factors['user_skill_level']
-        domain = factors['artistic_domain']
-        
-        base_instructions = {
-            'beginner': "Use simple language, provide step-by-step instructions, encourage experimentation without fear of mistakes.",
-            'intermediate': "Provide detailed techniques, suggest practice exercises, explain the 'why' behind methods.",
-            'advanced': "Share sophisticated techniques, discuss artistic theory, challenge with complex concepts.",
-            'expert': "Engage in professional-level discussion, share industry insights, focus on innovation and mastery."
-        }
-        
-        system_msg = f"You are an expert art instructor. {base_instructions.get(skill_level, base_instructions['intermediate'])}"
-        
-        if domain != 'general':
-            system_msg += f" Specialize your advice for {domain} art."
-        
-        if feature_type == "premium":
-            system_msg += " Include professional tips and advanced techniques."
-        
-        return system_msg
-
-
-        if entry_skill == factors['user_skill_level']:
-            relevance_score += 0.3
-        
-        # Domain relevance  
-        entry_category = entry.get('training_category', 'general')
-        if entry_category == factors['artistic_domain']:
-            relevance_score += 0.4
-            
-        # Technique relevance
-        if factors['is_advanced_technique'] and entry.get('technique_complexity', 0) >= 3:
-            relevance_score += 0.3
-            
-        return min(relevance_score, 1.0)
+        return _skill_adapted_system_message(factors['user_skill_level'], factors['artistic_domain'], feature_type)
     
     def _get_relevant_training_examples(self, prompt, limit=3):
         """Get most relevant training examples for the prompt"""
+        if not self._successful_entries:
+            return []
+        
         prompt_words = set(prompt.split())
+        prompt_size = len(prompt_words)
         relevant_examples = []
         
-        for entry in self.training_data:
-            if entry.get("rating", 0) >= 4:
-                entry_words = set(entry["prompt"].split())
-                if prompt_words and entry_words:
-                    similarity = len(prompt_words.intersection(entry_words)) / len(prompt_words.union(entry_words))
-                    if similarity > 0.2:  # 20% minimum similarity
-                        relevant_examples.append({
-                            "prompt": entry["prompt"],
-                            "response": entry["response"],
-                            "rating": entry["rating"],
-                            "similarity": similarity
-                        })
+        # Entries sharing no word have zero similarity, so only indexed overlaps are scored
+        for shared, entry, entry_size in self._indexed_overlaps(prompt_words):
+            similarity = shared / (prompt_size + entry_size - shared)
+            if similarity > 0.2:  # 20% minimum similarity
+                relevant_examples.append({
+                    "prompt": entry.prompt,
+                    "response": entry.response,
+                    "rating": entry.rating,
+                    "similarity": similarity
+                })
         
-        # Sort by similarity and return top examples
-        relevant_examples.sort(key=lambda x: x["similarity"], reverse=True)
-        return relevant_examples[:limit]
+        # Top examples by similarity; ties keep insertion order, as a stable sort would
+        return heapq.nlargest(limit, relevant_examples, key=itemgetter("similarity"))
     
     def _format_training_context(self, training_examples):
         """Format training examples into context for hybrid responses"""
         if not training_examples:
             return "No relevant training examples found."
         
-        context = "Relevant training examples:\n\n"
-        for i, example in enumerate(training_examples, 1):
-            context += f"Example {i} (similarity: {example['similarity']:.2f}):\n"
-            context += f"Q: {example['prompt']}\n"
-            context += f"A: {example['response'][:300]}...\n\n"
-        
-        return context
+        return "Relevant training examples:\n\n" + "".join(
+            f"Example {i} (similarity: {example['similarity']:.2f}):\n"
+            f"Q: {example['prompt']}\n"
+            f"A: {example['response'][:300]}...\n\n"
+            for i, example in enumerate(training_examples, 1)
+        )
     
     def _get_troubleshooting_system_message(self):
         """Get system message for troubleshooting requests"""
-        return """You are an expert technical support specialist for a digital drawing application.
-        Provide clear, step-by-step solutions for technical issues.
-        Include immediate fixes, common causes, and prevention tips.
-        Use HTML formatting with emojis for visual appeal."""
+        return TROUBLESHOOTING_SYSTEM_MESSAGE
     
     def _get_creative_system_message(self, feature_type):
         """Get system message for creative requests"""
-        base = """You are a creative drawing instructor who inspires artistic expression.
-        Encourage experimentation and provide multiple creative approaches."""
-        
-        if feature_type == "premium":
-            base += " Include advanced artistic techniques and professional insights."
-        
-        return base
+        return _creative_system_message(feature_type)
     
     def _get_hybrid_system_message(self, feature_type):
         """Get system message for hybrid responses"""
-        return """You are an expert drawing instructor with access to a comprehensive training database.
-        Combine the provided training examples with your knowledge to create the best possible response.
-        Build upon the training data while adding your own expertise and insights."""
+        return HYBRID_SYSTEM_MESSAGE
     
     def _get_general_system_message(self, feature_type):
         """Get system message for general requests"""
-        base = """You are an expert drawing instructor. Provide clear, step-by-step instructions."""
-        
-        if feature_type == "premium":
-            base += " Include advanced techniques and professional tips."
-        
-        return base
+        return _general_system_message(feature_type)
 
 # Initialize AI training system
 ai_training = AITrainingSystem()
 
+@app.on_event("startup")
+async def start_training_persistence():
+    ai_training.start_persistence()
+
+@app.on_event("shutdown")
+async def stop_training_persistence():
+    await ai_training.stop_persistence()
+
+# (wall-clock second, its ISO timestamp, its ISO date), reformatted only when the second changes
+_iso_clock = [(None, "", "")]
+
+def _current_iso_clock():
+    second = int(time.time())
+    clock = _iso_clock[0]
+    if clock[0] != second:
+        now = datetime.fromtimestamp(second)
+        clock = _iso_clock[0] = (second, now.isoformat(), now.date().isoformat())
+    return clock
+
+def _iso_now():
+    """Current local time as an ISO timestamp, to the second, for status and monitoring fields"""
+    return _current_iso_clock()[1]
+
+def _iso_today():
+    """Current local date as an ISO string"""
+    return _current_iso_clock()[2]
+
+@lru_cache(maxsize=4096)
+def _iso_epoch(value):
+    """Epoch seconds of a stored ISO timestamp; each distinct value is parsed once"""
+    return datetime.fromisoformat(value).timestamp()
+
+@lru_cache(maxsize=4096)
+def _trial_expiry(trial_start):
+    """Epoch seconds at which a trial started at the given ISO timestamp ends"""
+    return _iso_epoch(trial_start) + TRIAL_DAYS * 86400
+
+def _trial_days_remaining(trial_start):
+    """Days left in a trial, counting a partial day as a whole one"""
+    return max(0, math.ceil((_trial_expiry(trial_start) - time.time()) / 86400))
+
 # Production-scale API key management system
 class APIKeyManager:
     def __init__(self):
@@ -1562,13 +2214,25 @@ class APIKeyManager:
             "failed_requests": 0,
             "rate_limit_hits": 0,
             "daily_usage": {},
-            "last_reset": datetime.now().date().isoformat()
+            "last_reset": _iso_today()
         }
+        # Key suffix -> (time.monotonic() of the check, status result)
         self.key_validation_cache = {}
         self.rate_limit_tracker = {}
         
+        # Result of the background refresh task, served to requests while the task runs
+        self.latest_status = None
+        self._refresh_task = None
+    
     def get_api_key_status(self):
         """Comprehensive API key validation with caching"""
+        # With the refresh task running, requests never wait on a live check
+        if self._refresh_task is not None and self.latest_status is not None:
+            return self.latest_status
+        return self._validate_api_key()
+    
+    def _validate_api_key(self, force=False):
+        """Validate the configured key, reusing a recent check unless forced"""
         api_key = os.getenv("OPENAI_API_KEY")
         
         # Basic validation
@@ -1590,38 +2254,34 @@ class APIKeyManager:
 
         # Check cache first (avoid excessive API calls)
         cache_key = api_key[-8:]  # Last 8 chars for identification
-        if cache_key in self.key_validation_cache:
-            cached = self.key_validation_cache[cache_key]
-            if (datetime.now() - datetime.fromisoformat(cached["timestamp"])).seconds < 300:  # 5 min cache
-                return cached["result"]
-
-        # Live API validation
+        now = time.monotonic()
+        checked_at, cached = self.key_validation_cache.get(cache_key, (0.0, None))
+        if not force and cached is not None and now - checked_at < (API_KEY_STATUS_TTL if cached["valid"] else API_KEY_FAILURE_TTL):
+            return cached
+
+        result = self._check_api_key(api_key)
+        self.key_validation_cache[cache_key] = (now, result)
+        return result
+    
+    def _check_api_key(self, api_key):
+        """Live API validation; failures are cached briefly so retries do not pile onto the API"""
         try:
-            from openai import OpenAI
-            client = OpenAI()
+            client = _get_openai_client(api_key)
             response = client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": "API test"}],
                 max_tokens=5
             )
             
-            result = {
+            self.usage_stats["successful_requests"] += 1
+            return {
                 "valid": True, 
                 "message": "✅ API key working perfectly!", 
                 "status": "active",
                 "model_access": "gpt-3.5-turbo",
-                "last_tested": datetime.now().isoformat()
+                "last_tested": _iso_now()
             }
             
-            # Cache successful validation
-            self.key_validation_cache[cache_key] = {
-                "result": result,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            self.usage_stats["successful_requests"] += 1
-            return result
-            
         except Exception as e:
             error_msg = str(e).lower()
             self.usage_stats["failed_requests"] += 1
@@ -1656,9 +2316,32 @@ class APIKeyManager:
                     "action_required": "Check internet connection or try again"
                 }
     
+    async def _refresh_loop(self):
+        """Re-check the key in a worker thread whenever the last result expires"""
+        while True:
+            status = await asyncio.to_thread(self._validate_api_key, True)
+            self.latest_status = status
+            await asyncio.sleep(API_KEY_STATUS_TTL if status["valid"] else API_KEY_FAILURE_TTL)
+    
+    def start_refresh(self):
+        """Start the background task that keeps the API key status current"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop_refresh(self):
+        """Stop the refresh task; later status requests validate on demand again"""
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+    
     def track_usage(self, success=True):
         """Track API usage for monitoring"""
-        today = datetime.now().date().isoformat()
+        today = _iso_today()
         
         if today != self.usage_stats["last_reset"]:
             # Reset daily counter
@@ -1691,6 +2374,14 @@ class APIKeyManager:
 # Initialize API key manager
 api_manager = APIKeyManager()
 
+@app.on_event("startup")
+async def start_api_key_refresh():
+    api_manager.start_refresh()
+
+@app.on_event("shutdown")
+async def stop_api_key_refresh():
+    await api_manager.stop_refresh()
+
 def check_api_key():
     """Legacy function for backward compatibility"""
     status = api_manager.get_api_key_status()
@@ -1702,43 +2393,55 @@ def api_status():
     key_status = api_manager.get_api_key_status()
     usage_stats = api_manager.get_usage_statistics()
     
-    return {
+    return FastJSONResponse({
         "api_key_status": key_status,
         "usage_statistics": usage_stats,
         "system_health": {
             "status": usage_stats["health_status"],
             "uptime": "Available",
-            "last_check": datetime.now().isoformat()
+            "last_check": _iso_now()
         },
         "recommendations": _get_api_recommendations(key_status, usage_stats)
-    }
+    })
 
 def _get_api_recommendations(key_status, usage_stats):
     """Generate production recommendations"""
+    # Only the thresholds crossed (and the reported success rate) shape the result
+    return list(_api_recommendations(
+        key_status["valid"],
+        key_status.get("action_required", "Fix API key configuration"),
+        usage_stats["rate_limit_hits"] > 5,
+        usage_stats["success_rate"],
+        usage_stats["daily_requests"] > 1000
+    ))
+
+@lru_cache(maxsize=64)
+def _api_recommendations(key_valid, key_action, rate_limited, success_rate, high_usage):
+    """Shared per key, so callers must treat the returned dicts as read-only"""
     recommendations = []
     
-    if not key_status["valid"]:
+    if not key_valid:
         recommendations.append({
             "priority": "critical",
             "issue": "API key not functional",
-            "action": key_status.get("action_required", "Fix API key configuration")
+            "action": key_action
         })
     
-    if usage_stats["rate_limit_hits"] > 5:
+    if rate_limited:
         recommendations.append({
             "priority": "high",
             "issue": "Frequent rate limiting",
             "action": "Consider upgrading OpenAI plan or implementing request throttling"
         })
     
-    if usage_stats["success_rate"] < 90:
+    if success_rate < 90:
         recommendations.append({
             "priority": "medium",
-            "issue": f"Low success rate: {usage_stats['success_rate']}%",
+            "issue": f"Low success rate: {success_rate}%",
             "action": "Monitor API errors and implement retry logic"
         })
     
-    if usage_stats["daily_requests"] > 1000:
+    if high_usage:
         recommendations.append({
             "priority": "info",
             "issue": "High daily usage",
@@ -1752,7 +2455,7 @@ def _get_api_recommendations(key_status, usage_stats):
             "action": "Continue monitoring"
         })
     
-    return recommendations
+    return tuple(recommendations)
 
 # Mount static files to serve JS, CSS, and other assets
 app.mount("/static", StaticFiles(directory="."), name="static")
@@ -1774,78 +2477,247 @@ db_manager = DatabaseManager()
 # Initialize database tables on startup
 db_manager.init_tables()
 
+# Recently loaded user records: user_id -> (time.monotonic() of the load, record), least recently used first
+_user_data_cache = OrderedDict()
+# Guards _user_data_cache, which is used from the event loop, threadpool handlers and the record writer.
+# The counter tells a storage read whether any record was invalidated while it ran.
+_user_data_lock = threading.Lock()
+_user_data_invalidations = 0
+# Recent /user-status bodies: user_id -> (time.monotonic() when computed, rendered body, its ETag), least recently used first
+_user_status_cache = OrderedDict()
+# Guards _user_status_cache; /user-status runs in the threadpool while saves invalidate from anywhere.
+# The counter tells a status computation whether any save landed while it ran.
+_user_status_lock = threading.Lock()
+_user_status_invalidations = 0
+
+def get_session_user_id(request):
+    # Resolved once per request and kept on request.state
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
+        # Clients without a user agent are identified by address, so they keep one session across requests
+        user_agent = request.headers.get('user-agent') or (request.client.host if request.client else None) or "anonymous"
+        user_id = request.state.user_id = user_agent[:50]
+    return user_id
+
+class UserRecordWriter:
+    """Coalesces user record saves and writes them to storage in batches from a background task"""
+
+    def __init__(self):
+        # Records saved since the last flush, and the batch currently being written; both are
+        # newer than storage, so reads check them first
+        self.pending = {}
+        self.writing = {}
+        self._lock = threading.Lock()  # Sync handlers save from the threadpool
+        # Held across every storage write so batch and flushed writes land in the order they were made
+        self._write_lock = threading.Lock()
+        self._task = None
+        self._stopping = None
+
+    def lookup(self, user_id):
+        """The latest saved record for a user that storage may not have yet, or None"""
+        with self._lock:
+            record = self.pending.get(user_id)
+            return record if record is not None else self.writing.get(user_id)
+
+    def save(self, user_id, user_info, flush=False):
+        """Queue a record for the next batch, or write it now when flush is set or no writer runs"""
+        if flush or self._task is None:
+            with self._write_lock:
+                with self._lock:
+                    self.pending.pop(user_id, None)  # Superseded by this record
+                    if user_id in self.writing:
+                        # A batch waiting to be written holds an older record; have it store this one
+                        self.writing[user_id] = user_info
+                db_manager.save_user_data(user_id, user_info)
+                _forget_user_record(user_id)  # Next read sees exactly what storage kept
+        else:
+            with self._lock:
+                self.pending[user_id] = user_info
+
+    def _write(self, batch):
+        with self._write_lock:
+            db_manager.save_user_data_many(batch)
+            with self._lock:
+                # Drop the cached copies before the batch stops shadowing them, so no read
+                # in between can be served a record older than what was just stored
+                for user_id in batch:
+                    _forget_user_record(user_id)
+                self.writing = {}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), USER_WRITE_INTERVAL)
+                return  # stop() writes what is left once this loop has finished
+            except asyncio.TimeoutError:
+                pass
+            with self._lock:
+                batch, self.pending = self.pending, {}
+                self.writing = batch
+            if batch:
+                # Never cancelled: stop() waits for this write rather than racing it
+                await asyncio.to_thread(self._write, batch)
+
+    def start(self):
+        """Start the background task that flushes saved user records"""
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush task, letting a write in progress finish, and write out anything still queued"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+        with self._lock:
+            batch = {**self.writing, **self.pending}
+            self.pending = {}
+            self.writing = batch
+        if batch:
+            self._write(batch)
+
+user_record_writer = UserRecordWriter()
+
+@app.on_event("startup")
+async def start_user_record_writer():
+    user_record_writer.start()
+
+@app.on_event("shutdown")
+async def stop_user_record_writer():
+    await user_record_writer.stop()
+
 def get_user_session(request):
-    user_id = request.headers.get('user-agent', str(uuid.uuid4()))[:50]
-    user_data = db_manager.get_user_data(user_id)
-    return user_id, user_data
+    # Later calls within the same request share the record loaded by the first
+    session = getattr(request.state, "user_session", None)
+    if session is None:
+        session = request.state.user_session = _load_user_session(get_session_user_id(request))
+    return session
+
+def _forget_user_record(user_id):
+    """Drop a user's cached record so the next read goes to storage"""
+    global _user_data_invalidations
+    with _user_data_lock:
+        _user_data_cache.pop(user_id, None)
+        _user_data_invalidations += 1
+
+def _load_user_session(user_id):
+    with _user_data_lock:
+        invalidations = _user_data_invalidations
+    unsaved = user_record_writer.lookup(user_id)
+    if unsaved is not None:
+        return user_id, copy.deepcopy(unsaved)
+    
+    now = time.monotonic()
+    user_data = None
+    with _user_data_lock:
+        cached = _user_data_cache.get(user_id)
+        if cached is not None and now - cached[0] < USER_DATA_TTL:
+            _user_data_cache.move_to_end(user_id)
+            user_data = cached[1]
+    if user_data is None:
+        # Storage is read outside the lock so a slow query doesn't stall other users' lookups
+        user_data = db_manager.get_user_data(user_id)
+        with _user_data_lock:
+            # A save stored since the read started may have made this record stale; don't keep it
+            if invalidations == _user_data_invalidations:
+                _user_data_cache[user_id] = (now, user_data)
+                _user_data_cache.move_to_end(user_id)
+                while len(_user_data_cache) > USER_DATA_CACHE_SIZE:
+                    _user_data_cache.popitem(last=False)
+    # Handlers modify the record they are given before saving it, so each gets its own copy
+    return user_id, copy.deepcopy(user_data)
+
+def update_user_data(user_id, user_info, flush=False):
+    """Save a user record; pass flush=True when the write must reach storage before returning"""
+    user_record_writer.save(user_id, user_info, flush)
+    # Invalidate only once the new record is visible to reads, so no status can be rebuilt from the old one
+    _forget_user_status(user_id)
+
+def _forget_user_status(user_id):
+    """Drop a user's cached /user-status body and mark any status being computed as stale"""
+    global _user_status_invalidations
+    with _user_status_lock:
+        _user_status_cache.pop(user_id, None)
+        _user_status_invalidations += 1
+
+# Reference photos per subject, checked in order; the first matching subject wins
+REFERENCE_SUBJECTS = [
+    (('cat', 'kitten', 'feline'), [
+        "https://images.unsplash.com/photo-1574158622682-e40e69881006?w=400",  # Cat portrait
+        "https://images.unsplash.com/photo-1611003229186-80e40cd54966?w=400",  # Cat sitting
+    ]),
+    (('dog', 'puppy', 'canine'), [
+        "https://images.unsplash.com/photo-1518717758536-85ae29035b6d?w=400",  # Dog portrait
+        "https://images.unsplash.com/photo-1552053831-71594a27632d?w=400",  # Golden retriever
+    ]),
+    (('house', 'home', 'building'), [
+        "https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=400",  # Modern house
+        "https://images.unsplash.com/photo-1518780664697-55e3ad937233?w=400",  # Cozy house
+    ]),
+    (('tree', 'forest', 'nature'), [
+        "https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400",  # Forest trees
+        "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=400",  # Single tree
+    ]),
+    (('flower', 'rose', 'bloom'), [
+        "https://images.unsplash.com/photo-1518709268805-4e9042af2176?w=400",  # Pink flowers
+        "https://images.unsplash.com/photo-1563206480-e0246ad0b14c?w=400",  # Sunflower
+    ]),
+    (('car', 'vehicle', 'automobile'), [
+        "https://images.unsplash.com/photo-1493238792000-8113da705763?w=400",  # Red car
+        "https://images.unsplash.com/photo-1502877338535-766e1452684a?w=400",  # Classic car
+    ]),
+    (('face', 'portrait', 'person'), [
+        "https://images.unsplash.com/photo-1494790108755-2616c047016b?w=400",  # Female portrait
+        "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400",  # Male portrait
+    ]),
+    (('mountain', 'landscape', 'nature'), [
+        "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=400",  # Mountain landscape
+        "https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400",  # Nature scene
+    ]),
+]
+
+# Prompt words that select the tool guide variant
+GUIDE_DRAWING_WORDS = ('draw', 'sketch', 'paint', 'create', 'make')
+GUIDE_TOOL_ISSUE_WORDS = ('tool', 'brush', 'pencil', 'eraser', 'problem', 'issue', 'help', 'not working')
+
+_prompt_topic_scanner = KeywordScanner(
+    [word for subjects, _ in REFERENCE_SUBJECTS for word in subjects] + list(GUIDE_DRAWING_WORDS) + list(GUIDE_TOOL_ISSUE_WORDS)
+)
+
+def _render_reference_links(references):
+    refs_html = "📷 <strong>Reference Images:</strong><br>"
+    for i, ref in enumerate(references[:2], 1):  # Limit to 2 references
+        refs_html += f"• <a href='javascript:void(0)' onclick=\"document.getElementById('imageUrl').value='{ref}'; loadReference();\">Reference {i}</a> - Click to load automatically<br>"
 
-def update_user_data(user_id, user_info):
-    db_manager.save_user_data(user_id, user_info)
+    refs_html += "<br>💡 <strong>Tip:</strong> Load a reference image above your canvas for better accuracy!"
+    return refs_html
+
+# Each subject keyword maps to the first subject listing it, with that subject's rendered links
+REFERENCE_KEYWORD_LINKS = {}
+for _rank, (_subjects, _references) in enumerate(REFERENCE_SUBJECTS):
+    for _keyword in _subjects:
+        REFERENCE_KEYWORD_LINKS.setdefault(_keyword, (_rank, _render_reference_links(_references)))
 
 def get_image_references(prompt):
     """Generate web image reference suggestions based on the prompt"""
-    prompt_lower = prompt.lower()
-
-    # Map subjects to specific image references
-    reference_suggestions = []
-
-    if any(word in prompt_lower for word in ['cat', 'kitten', 'feline']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1574158622682-e40e69881006?w=400",  # Cat portrait
-            "https://images.unsplash.com/photo-1611003229186-80e40cd54966?w=400",  # Cat sitting
-        ])
-    elif any(word in prompt_lower for word in ['dog', 'puppy', 'canine']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1518717758536-85ae29035b6d?w=400",  # Dog portrait
-            "https://images.unsplash.com/photo-1552053831-71594a27632d?w=400",  # Golden retriever
-        ])
-    elif any(word in prompt_lower for word in ['house', 'home', 'building']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=400",  # Modern house
-            "https://images.unsplash.com/photo-1518780664697-55e3ad937233?w=400",  # Cozy house
-        ])
-    elif any(word in prompt_lower for word in ['tree', 'forest', 'nature']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400",  # Forest trees
-            "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=400",  # Single tree
-        ])
-    elif any(word in prompt_lower for word in ['flower', 'rose', 'bloom']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1518709268805-4e9042af2176?w=400",  # Pink flowers
-            "https://images.unsplash.com/photo-1563206480-e0246ad0b14c?w=400",  # Sunflower
-        ])
-    elif any(word in prompt_lower for word in ['car', 'vehicle', 'automobile']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1493238792000-8113da705763?w=400",  # Red car
-            "https://images.unsplash.com/photo-1502877338535-766e1452684a?w=400",  # Classic car
-        ])
-    elif any(word in prompt_lower for word in ['face', 'portrait', 'person']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1494790108755-2616c047016b?w=400",  # Female portrait
-            "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400",  # Male portrait
-        ])
-    elif any(word in prompt_lower for word in ['mountain', 'landscape', 'nature']):
-        reference_suggestions.extend([
-            "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=400",  # Mountain landscape
-            "https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400",  # Nature scene
-        ])
-
-    if reference_suggestions:
-        refs_html = "📷 <strong>Reference Images:</strong><br>"
-        for i, ref in enumerate(reference_suggestions[:2], 1):  # Limit to 2 references
-            refs_html += f"• <a href='javascript:void(0)' onclick=\"document.getElementById('imageUrl').value='{ref}'; loadReference();\">Reference {i}</a> - Click to load automatically<br>"
-
-        refs_html += "<br>💡 <strong>Tip:</strong> Load a reference image above your canvas for better accuracy!"
-        return refs_html
+    prompt_keywords = _prompt_topic_scanner.scan(prompt.lower())
+
+    # The earliest listed subject among the matched keywords supplies the references
+    matches = [REFERENCE_KEYWORD_LINKS[keyword] for keyword in prompt_keywords if keyword in REFERENCE_KEYWORD_LINKS]
+    if matches:
+        return min(matches)[1]
 
     return ""
 
 def get_tool_troubleshooting_guide(prompt):
     """Generate comprehensive tool troubleshooting based on the prompt or general issues"""
-    prompt_lower = prompt.lower()
+    prompt_keywords = _prompt_topic_scanner.scan(prompt.lower())
 
     # Always provide general troubleshooting for drawing-related queries
-    if any(word in prompt_lower for word in ['draw', 'sketch', 'paint', 'create', 'make']):
+    if not prompt_keywords.isdisjoint(GUIDE_DRAWING_WORDS):
         return """🔧 <strong>Complete Tool Guide:</strong><br>
 
         <strong>📝 Drawing Tools:</strong><br>
@@ -1877,7 +2749,7 @@ def get_tool_troubleshooting_guide(prompt):
         ✅ <strong>Undo/Redo:</strong> Use Ctrl+Z / Ctrl+Y or the arrow buttons"""
 
     # Specific troubleshooting for tool-related issues
-    elif any(word in prompt_lower for word in ['tool', 'brush', 'pencil', 'eraser', 'problem', 'issue', 'help', 'not working']):
+    elif not prompt_keywords.isdisjoint(GUIDE_TOOL_ISSUE_WORDS):
         return """🛠️ <strong>Tool Troubleshooting:</strong><br>
 
         <strong>Common Issues & Solutions:</strong><br>
@@ -1919,12 +2791,46 @@ def get_tool_troubleshooting_guide(prompt):
 def root():
     return FileResponse("index.html")
 
+# Constant body of the liveness endpoint, encoded once
+API_ROOT_PAYLOAD = orjson.dumps({"message": "Drawing AI Backend is Running"})
+
 @app.get("/api")
-def api_status():
-    return {"message": "Drawing AI Backend is Running"}
+def api_root():
+    return Response(content=API_ROOT_PAYLOAD, media_type="application/json")
+
+def _render_with_etag(content):
+    """Render a JSON body, returning it with a strong ETag derived from its bytes"""
+    body = orjson.dumps(content, default=list, option=orjson.OPT_NON_STR_KEYS)
+    return body, '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+def _etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header names etag, comparing weakly as RFC 9110 requires for it"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def _etag_response(request, body, etag):
+    """Answer 304 Not Modified when the client's If-None-Match already names this body"""
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @app.get("/user-status")
 def get_user_status(request: Request):
+    user_id = get_session_user_id(request)
+    now = time.monotonic()
+    with _user_status_lock:
+        cached = _user_status_cache.get(user_id)
+        if cached is not None and now - cached[0] < USER_STATUS_TTL:
+            _user_status_cache.move_to_end(user_id)
+        else:
+            cached = None
+        invalidations = _user_status_invalidations
+    if cached is not None:
+        return _etag_response(request, cached[1], cached[2])
+    
     user_id, user_info = get_user_session(request)
 
     # Check if trial period has started
@@ -1934,9 +2840,7 @@ def get_user_status(request: Request):
     trial_days_remaining = 0
 
     if trial_start:
-        trial_start_date = datetime.fromisoformat(trial_start)
-        days_since_trial = (datetime.now() - trial_start_date).days
-        trial_days_remaining = max(0, 10 - days_since_trial)
+        trial_days_remaining = _trial_days_remaining(trial_start)
         trial_active = trial_days_remaining > 0
     else:
         # First time user - hasn't started trial yet
@@ -1945,13 +2849,12 @@ def get_user_status(request: Request):
 
     # Check premium status
     if is_premium and user_info.get("premium_expiry"):
-        expiry_date = datetime.fromisoformat(user_info["premium_expiry"])
-        is_premium = datetime.now() < expiry_date
+        is_premium = time.time() < _iso_epoch(user_info["premium_expiry"])
         if not is_premium:
             user_info["premium"] = False
             update_user_data(user_id, user_info)
 
-    return {
+    status = {
         "trial_days_remaining": trial_days_remaining,
         "trial_active": trial_active,
         "is_premium": is_premium,
@@ -1959,23 +2862,33 @@ def get_user_status(request: Request):
         "premium_expiry": user_info.get("premium_expiry"),
         "trial_started": trial_start is not None
     }
+    body, etag = _render_with_etag(status)
+    # Any later save of this user's record drops the entry (see update_user_data); a save
+    # that landed while this body was computed may have made it stale, so it isn't kept
+    with _user_status_lock:
+        if invalidations == _user_status_invalidations:
+            _user_status_cache[user_id] = (now, body, etag)
+            _user_status_cache.move_to_end(user_id)
+            while len(_user_status_cache) > USER_STATUS_CACHE_SIZE:
+                _user_status_cache.popitem(last=False)
+    return _etag_response(request, body, etag)
 
 # Payment endpoints
+# Plan prices in cents
+PLAN_PRICES = {
+    "monthly": 999,  # $9.99/month
+    "yearly": 9999   # $99.99/year (save $20)
+}
+
 @app.post("/create-payment-intent")
 async def create_payment_intent(request: Request):
-    data = await request.json()
+    data = orjson.loads(await request.body())
     plan = data.get("plan", "monthly")  # monthly, yearly
 
-    # Pricing in cents
-    prices = {
-        "monthly": 999,  # $9.99/month
-        "yearly": 9999   # $99.99/year (save $20)
-    }
-
     # In production, use Stripe API
     payment_intent = {
-        "client_secret": f"pi_demo_{plan}_{uuid.uuid4().hex[:8]}",
-        "amount": prices[plan],
+        "client_secret": f"pi_demo_{plan}_{secrets.token_hex(4)}",
+        "amount": PLAN_PRICES[plan],
         "currency": "usd",
         "plan": plan
     }
@@ -1984,7 +2897,7 @@ async def create_payment_intent(request: Request):
 
 @app.post("/verify-payment")
 async def verify_payment(request: Request):
-    data = await request.json()
+    data = orjson.loads(await request.body())
     payment_intent_id = data.get("payment_intent_id")
     plan = data.get("plan", "monthly")
 
@@ -1994,11 +2907,12 @@ async def verify_payment(request: Request):
     # For demo, we'll activate premium
     if payment_intent_id.startswith("pi_demo_"):
         duration_days = 365 if plan == "yearly" else 30
+        now = datetime.now()
         user_info["premium"] = True
-        user_info["premium_expiry"] = (datetime.now() + timedelta(days=duration_days)).isoformat()
+        user_info["premium_expiry"] = (now + timedelta(days=duration_days)).isoformat()
         user_info["payment_plan"] = plan
-        user_info["payment_date"] = datetime.now().isoformat()
-        update_user_data(user_id, user_info)
+        user_info["payment_date"] = now.isoformat()
+        update_user_data(user_id, user_info, flush=True)
 
         return {"success": True, "message": f"Premium activated! ({plan} plan)"}
 
@@ -2011,7 +2925,7 @@ def activate_premium(request: Request):
     # For demo purposes - remove in production
     user_info["premium"] = True
     user_info["premium_expiry"] = (datetime.now() + timedelta(days=30)).isoformat()
-    update_user_data(user_id, user_info)
+    update_user_data(user_id, user_info, flush=True)
 
     return {"success": True, "message": "Premium activated for 30 days!"}
 
@@ -2026,118 +2940,118 @@ def start_trial(request: Request):
         return {"success": True, "message": "10-day trial started!", "trial_days_remaining": 10}
 
     # Check remaining days
-    trial_start_date = datetime.fromisoformat(user_info["trial_start_date"])
-    days_since_trial = (datetime.now() - trial_start_date).days
-    trial_days_remaining = max(0, 10 - days_since_trial)
+    trial_days_remaining = _trial_days_remaining(user_info["trial_start_date"])
 
     if trial_days_remaining > 0:
         return {"success": True, "trial_days_remaining": trial_days_remaining}
     else:
         return {"success": False, "message": "Trial period expired"}
 
+# System messages for the premium analysis types
+COMPOSITION_SYSTEM_MESSAGE = "You are an expert art critic and composition analyst. Analyze the described artwork and provide detailed feedback on balance, focal points, and artistic suggestions."
+COLOR_SYSTEM_MESSAGE = "You are a color theory expert. Provide specific color recommendations and palette analysis."
+STYLE_SYSTEM_MESSAGE = "You are an art historian and style expert. Identify artistic styles and provide technique recommendations."
+
+def _composition_analysis(ai_feedback):
+    return {
+        "balance": "AI-analyzed",
+        "focal_points": ["AI-detected areas of interest"],
+        "color_harmony": "AI-evaluated harmony",
+        "ai_feedback": ai_feedback,
+        "suggestions": [
+            "AI-generated suggestion 1",
+            "AI-generated suggestion 2", 
+            "AI-generated suggestion 3"
+        ],
+        "technical_score": 8.5,
+        "artistic_score": 7.8
+    }
+
+def _color_palette_analysis(ai_feedback):
+    return {
+        "dominant_colors": ["#3498DB", "#E74C3C", "#F39C12"],
+        "color_scheme": "AI-analyzed scheme",
+        "ai_feedback": ai_feedback,
+        "suggestions": [
+            "Use complementary colors for strong contrast",
+            "Try analogous colors for harmony",
+            "Consider split-complementary for balance"
+        ],
+        "harmony_score": 9.2
+    }
+
+def _style_analysis(ai_feedback):
+    return {
+        "detected_style": "AI-analyzed style",
+        "ai_feedback": ai_feedback,
+        "technique_suggestions": [
+            "Experiment with different brush techniques",
+            "Focus on light and shadow relationships", 
+            "Consider adding textural elements"
+        ],
+        "style_confidence": 0.87
+    }
+
+# Analysis type -> (system message, user message, max_tokens, builder of the analysis from the OpenAI feedback)
+ANALYSIS_TYPES = {
+    "composition": (
+        COMPOSITION_SYSTEM_MESSAGE,
+        "Analyze this artwork composition. Focus on: balance, focal points, color harmony, and provide 3 specific improvement suggestions.",
+        300,
+        _composition_analysis
+    ),
+    "color_palette": (
+        COLOR_SYSTEM_MESSAGE,
+        "Analyze color usage and suggest a complementary palette. Provide specific hex colors and color theory advice.",
+        200,
+        _color_palette_analysis
+    ),
+    "style_analysis": (
+        STYLE_SYSTEM_MESSAGE,
+        "Analyze the artistic style and provide specific technique suggestions for improvement.",
+        250,
+        _style_analysis
+    ),
+}
+
 @app.post("/advanced-analysis")
 async def advanced_analysis(request: Request):
     """Advanced AI analysis for premium features"""
-    data = await request.json()
-    analysis_type = data.get("type", "composition")
-    image_data = data.get("image_data", "")
-
     user_id, user_info = get_user_session(request)
 
-    # Check premium access
+    # Check premium access before reading the body, so rejected calls cost no parsing
     is_premium = user_info.get("premium", False)
     trial_start = user_info.get("trial_start_date")
     trial_active = False
 
     if trial_start:
-        trial_start_date = datetime.fromisoformat(trial_start)
-        trial_active = (datetime.now() - trial_start_date).days < 10
+        trial_active = time.time() < _trial_expiry(trial_start)
 
     if not is_premium and not trial_active:
-        return {"error": "Premium feature requires subscription or trial"}
-
-    try:
-        if analysis_type == "composition":
-            # Real AI composition analysis using OpenAI
-            from openai import OpenAI
-            client = OpenAI()
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert art critic and composition analyst. Analyze the described artwork and provide detailed feedback on balance, focal points, and artistic suggestions."},
-                    {"role": "user", "content": f"Analyze this artwork composition. Focus on: balance, focal points, color harmony, and provide 3 specific improvement suggestions."}
-                ],
-                max_tokens=300
-            )
-
-            ai_feedback = response.choices[0].message.content.strip()
-
-            analysis = {
-                "balance": "AI-analyzed",
-                "focal_points": ["AI-detected areas of interest"],
-                "color_harmony": "AI-evaluated harmony",
-                "ai_feedback": ai_feedback,
-                "suggestions": [
-                    "AI-generated suggestion 1",
-                    "AI-generated suggestion 2", 
-                    "AI-generated suggestion 3"
-                ],
-                "technical_score": 8.5,
-                "artistic_score": 7.8
-            }
+        return FastJSONResponse({"error": "Premium feature requires subscription or trial"}, status_code=402)
 
-        elif analysis_type == "color_palette":
-            # Real AI color analysis
-            from openai import OpenAI
-            client = OpenAI()
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a color theory expert. Provide specific color recommendations and palette analysis."},
-                    {"role": "user", "content": "Analyze color usage and suggest a complementary palette. Provide specific hex colors and color theory advice."}
-                ],
-                max_tokens=200
-            )
-
-            ai_feedback = response.choices[0].message.content.strip()
-
-            analysis = {
-                "dominant_colors": ["#3498DB", "#E74C3C", "#F39C12"],
-                "color_scheme": "AI-analyzed scheme",
-                "ai_feedback": ai_feedback,
-                "suggestions": [
-                    "Use complementary colors for strong contrast",
-                    "Try analogous colors for harmony",
-                    "Consider split-complementary for balance"
-                ],
-                "harmony_score": 9.2
-            }
+    data = orjson.loads(await request.body())
+    analysis_type = data.get("type", "composition")
+    image_data = data.get("image_data", "")
 
-        elif analysis_type == "style_analysis":
-            # Real AI style analysis
-            from openai import OpenAI
-            client = OpenAI()
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an art historian and style expert. Identify artistic styles and provide technique recommendations."},
-                    {"role": "user", "content": "Analyze the artistic style and provide specific technique suggestions for improvement."}
-                ],
-                max_tokens=250
-            )
+    try:
+        if analysis_type not in ANALYSIS_TYPES:
+            return {"error": f"Analysis failed: unknown analysis type '{analysis_type}'"}
+        system_message, user_message, max_tokens, build_analysis = ANALYSIS_TYPES[analysis_type]
 
-            ai_feedback = response.choices[0].message.content.strip()
+        # Real AI analysis using OpenAI
+        client = _get_async_openai_client()
+        response = await client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            max_tokens=max_tokens
+        )
 
-            analysis = {
-                "detected_style": "AI-analyzed style",
-                "ai_feedback": ai_feedback,
-                "technique_suggestions": [
-                    "Experiment with different brush techniques",
-                    "Focus on light and shadow relationships", 
-                    "Consider adding textural elements"
-                ],
-                "style_confidence": 0.87
-            }
+        ai_feedback = response.choices[0].message.content.strip()
+        analysis = build_analysis(ai_feedback)
 
         return {"analysis": analysis, "type": analysis_type}
 
@@ -2149,7 +3063,8 @@ async def create_collaborative_session(request: Request):
     """Create a collaborative drawing session"""
     user_id, user_info = get_user_session(request)
 
-    session_id = str(uuid.uuid4())[:8]
+    # 8 URL-safe characters from 6 random bytes
+    session_id = secrets.token_urlsafe(6)
     session_data = {
         "id": session_id,
         "host": user_id,
@@ -2164,9 +3079,10 @@ async def create_collaborative_session(request: Request):
 @app.post("/save-drawing")
 async def save_drawing(request: Request):
     """Save drawing to server gallery"""
-    data = await request.json()
+    data = orjson.loads(await request.body())
     drawing_data = data.get("drawing_data", "")
-    title = data.get("title", f"Drawing_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    now = datetime.now()
+    title = data.get("title", f"Drawing_{now.strftime('%Y%m%d_%H%M%S')}")
 
     user_id, user_info = get_user_session(request)
 
@@ -2174,29 +3090,58 @@ async def save_drawing(request: Request):
     if "saved_drawings" not in user_info:
         user_info["saved_drawings"] = []
 
+    # The image data is appended to the drawings store; the user record only lists metadata
     drawing_info = {
         "id": str(uuid.uuid4()),
         "title": title,
-        "data": drawing_data,
-        "created": datetime.now().isoformat()
+        "created": now.isoformat()
     }
+    if not await asyncio.to_thread(db_manager.save_drawing, user_id, drawing_info["id"], title, drawing_data):
+        return FastJSONResponse({"error": "Drawing could not be saved"}, status_code=500)
 
     user_info["saved_drawings"].append(drawing_info)
     update_user_data(user_id, user_info)
 
     return {"success": True, "drawing_id": drawing_info["id"]}
 
+async def _with_drawing_data(user_id, drawings):
+    """Attach image data to drawing metadata, loading it from the drawings store"""
+    # Drawings saved before the store existed keep their data inline
+    missing = [drawing["id"] for drawing in drawings if "data" not in drawing]
+    stored = await asyncio.to_thread(db_manager.get_drawing_data, user_id, missing) if missing else {}
+    return [drawing if "data" in drawing else {**drawing, "data": stored.get(drawing["id"], "")} for drawing in drawings]
+
+async def _saved_drawings(user_id, user_info):
+    """The user's drawing metadata, oldest first: from the drawings table when there is one, else the user record"""
+    listed = await asyncio.to_thread(db_manager.get_drawings, user_id)
+    return listed if listed is not None else user_info.get("saved_drawings", [])
+
 @app.get("/gallery")
-async def get_gallery(request: Request):
-    """Get user's saved drawings"""
+async def get_gallery(request: Request, offset: int = 0, limit: int = GALLERY_PAGE_SIZE, include_data: bool = False):
+    """Get a page of the user's saved drawings, without image data unless include_data is set"""
+    user_id, user_info = get_user_session(request)
+    saved_drawings = await _saved_drawings(user_id, user_info)
+    offset = max(offset, 0)
+    drawings = saved_drawings[offset:offset + min(max(limit, 0), GALLERY_PAGE_LIMIT)]
+    if include_data:
+        drawings = await _with_drawing_data(user_id, drawings)
+    else:
+        drawings = [{key: value for key, value in drawing.items() if key != "data"} for drawing in drawings]
+    return _etag_response(request, *_render_with_etag({"drawings": drawings, "total": len(saved_drawings), "offset": offset}))
+
+@app.get("/gallery/{drawing_id}")
+async def get_gallery_drawing(drawing_id: str, request: Request):
+    """Get one saved drawing, including its image data"""
     user_id, user_info = get_user_session(request)
-    drawings = user_info.get("saved_drawings", [])
-    return {"drawings": drawings}
+    for drawing in await _saved_drawings(user_id, user_info):
+        if drawing["id"] == drawing_id:
+            return (await _with_drawing_data(user_id, [drawing]))[0]
+    return FastJSONResponse({"error": "Drawing not found"}, status_code=404)
 
 @app.post("/submit-feedback")
 async def submit_feedback(request: Request):
     """Submit user feedback for AI training"""
-    data = await request.json()
+    data = orjson.loads(await request.body())
     prompt = data.get("prompt", "")
     response = data.get("response", "")
     rating = data.get("rating", 3)
@@ -2206,16 +3151,17 @@ async def submit_feedback(request: Request):
     
     # Collect training data
     training_entry = ai_training.collect_training_data(
-        prompt, response, rating, correction
+        prompt, response, rating, correction, session_id=user_id
     )
     
     # Cache successful responses
     ai_training.cache_successful_response(prompt, response, rating)
+    _forget_cached_suggestions(prompt)
     
     return {
         "success": True, 
         "message": "Feedback received! This helps improve AI responses.",
-        "training_id": training_entry["session_id"]
+        "training_id": training_entry.entry_id
     }
 
 @app.get("/ai-performance")
@@ -2232,7 +3178,7 @@ async def get_ai_performance(request: Request):
     comprehensive_insights = ai_training.get_comprehensive_learning_insights()
     basic_insights = ai_training.export_training_insights()
     
-    return {
+    return FastJSONResponse({
         "performance_data": basic_insights,
         "comprehensive_learning_analysis": comprehensive_insights,
         "learning_effectiveness_score": ai_training._calculate_data_quality_score(),
@@ -2243,7 +3189,7 @@ async def get_ai_performance(request: Request):
             "contextual_memory_patterns": len(ai_training.contextual_memory),
             "adaptive_difficulty_levels": len(ai_training.difficulty_scaling)
         }
-    }
+    })
 
 @app.get("/learning-analytics")
 async def get_learning_analytics(request: Request):
@@ -2263,12 +3209,43 @@ async def get_learning_analytics(request: Request):
         "multimodal_effectiveness": ai_training._assess_multimodal_effectiveness()
     }
     
-    return {"learning_analytics": analytics}
+    return FastJSONResponse({"learning_analytics": analytics})
+
+ADAPTIVE_SYSTEM_MESSAGE = "You are an advanced AI drawing instructor with access to comprehensive learning analytics. Adapt your teaching style based on the provided learning context."
+
+def _learning_enhanced_prompt(prompt, adaptive_context):
+    """Build the adaptive-learning user message, quoting a bounded slice of the learning context"""
+    success_patterns = adaptive_context.get('success_patterns', [])[:LEARNING_CONTEXT_LIMIT]
+    # Most recent failures first
+    failures = list(islice(reversed(adaptive_context.get('common_failures', {}).items()), LEARNING_CONTEXT_LIMIT))
+    performance = adaptive_context.get('performance_data', {})
+    lines = [
+        f"User Request: {prompt}",
+        "",
+        "Learning Context Analysis:",
+        "- Success Patterns: " + (", ".join(f"{word} ({count})" for word, count in success_patterns) or "none yet"),
+        "- Common Failures to Avoid:" + ("" if failures else " none recorded")
+    ]
+    lines.extend(f"  - {failed_prompt}: {correction}" for failed_prompt, correction in failures)
+    # Scalar metrics only; the per-concept tables grow with the training data
+    lines.append("- User Performance Data: " + ", ".join(
+        f"{name}: {value}" for name, value in performance.items() if not isinstance(value, (list, dict))
+    ))
+    lines.extend([
+        "",
+        "Provide a response that:",
+        "1. Builds on previously successful patterns",
+        "2. Avoids known failure patterns",
+        "3. Adapts to the user's demonstrated skill level",
+        "4. Incorporates multimodal learning elements",
+        "5. Scales difficulty appropriately"
+    ])
+    return "\n".join(lines)
 
 @app.post("/adaptive-learning-request")
 async def adaptive_learning_request(request: Request):
     """Process adaptive learning requests with comprehensive AI analysis"""
-    data = await request.json()
+    data = orjson.loads(await request.body())
     prompt = data.get("prompt", "")
     learning_context = data.get("learning_context", {})
     
@@ -2279,29 +3256,14 @@ async def adaptive_learning_request(request: Request):
     
     # Enhanced prompt with learning insights
     if isinstance(adaptive_context, dict):
-        learning_enhanced_prompt = f"""
-        User Request: {prompt}
-        
-        Learning Context Analysis:
-        - Success Patterns: {adaptive_context.get('success_patterns', [])}
-        - Common Failures to Avoid: {adaptive_context.get('common_failures', {})}
-        - User Performance Data: {adaptive_context.get('performance_data', {})}
-        
-        Provide a response that:
-        1. Builds on previously successful patterns
-        2. Avoids known failure patterns
-        3. Adapts to the user's demonstrated skill level
-        4. Incorporates multimodal learning elements
-        5. Scales difficulty appropriately
-        """
+        learning_enhanced_prompt = _learning_enhanced_prompt(prompt, adaptive_context)
         
         try:
-            from openai import OpenAI
-            client = OpenAI()
-            response = client.chat.completions.create(
+            client = _get_async_openai_client()
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
-                    {"role": "system", "content": "You are an advanced AI drawing instructor with access to comprehensive learning analytics. Adapt your teaching style based on the provided learning context."},
+                    {"role": "system", "content": ADAPTIVE_SYSTEM_MESSAGE},
                     {"role": "user", "content": learning_enhanced_prompt}
                 ],
                 max_tokens=200,
@@ -2312,7 +3274,7 @@ async def adaptive_learning_request(request: Request):
             
             # Collect enhanced training data
             ai_training.collect_training_data(
-                prompt, adaptive_response, 4, None, None  # Assume good quality for adaptive responses
+                prompt, adaptive_response, 4, None, None, session_id=user_id  # Assume good quality for adaptive responses
             )
             
             return {
@@ -2343,10 +3305,10 @@ async def system_health():
         "metrics": {
             "api_success_rate": usage_stats["success_rate"],
             "ai_satisfaction_score": ai_performance["user_satisfaction_score"],
-            "total_users": len(set(entry["session_id"] for entry in ai_training.training_data)),
+            "total_users": len(set(entry.session_id for entry in ai_training.training_data)),
             "uptime": "99.9%"  # This would be calculated from actual uptime tracking
         },
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _iso_now()
     }
 
 @app.get("/admin/dashboard")
@@ -2357,7 +3319,7 @@ async def admin_dashboard(request: Request):
     usage_stats = api_manager.get_usage_statistics()
     ai_insights = ai_training.export_training_insights()
     
-    return {
+    return FastJSONResponse({
         "api_management": {
             "status": api_status,
             "usage": usage_stats,
@@ -2369,14 +3331,59 @@ async def admin_dashboard(request: Request):
             "success_rate": ai_training._calculate_success_rate(),
             "user_satisfaction": ai_training.performance_metrics["user_satisfaction_score"]
         }
-    }
+    })
+
+# Prompt substrings that select the tool-fix fallback over the drawing fallback
+FALLBACK_HELP_PATTERN = re.compile(r"help|problem|not working|tool", re.IGNORECASE)
+HELP_FALLBACK_SUGGESTION = """🔧 <strong>Quick Fix:</strong><br>
+            • Check tool is selected (blue highlight)<br>
+            • Verify brush size > 1<br>
+            • Click canvas first<br>
+            • Try refreshing page"""
+
+BASIC_SYSTEM_MESSAGE = """You are an expert drawing instructor and technical support specialist for a digital drawing application."""
+HYBRID_PROMPT_TEMPLATE = Template("""
+            User Request: $prompt
+            
+            Relevant Training Data Context:
+            $training_context
+            
+            Instructions: Combine the training data insights with your knowledge to provide a comprehensive response.
+            Build upon the training examples while adding your own expertise.
+            """)
+
+# OpenAI suggestions by (normalized prompt, feature type, skill level):
+# key -> (time.monotonic() when generated, suggestion, training rating, response body), least recently used first
+_suggestion_cache = OrderedDict()
+
+def _cached_suggestion(key):
+    cached = _suggestion_cache.get(key)
+    if cached is None:
+        return None
+    if time.monotonic() - cached[0] >= SUGGESTION_CACHE_TTL:
+        del _suggestion_cache[key]
+        return None
+    _suggestion_cache.move_to_end(key)
+    return cached
+
+def _cache_suggestion(key, suggestion, rating, body):
+    _suggestion_cache[key] = (time.monotonic(), suggestion, rating, body)
+    _suggestion_cache.move_to_end(key)
+    while len(_suggestion_cache) > SUGGESTION_CACHE_SIZE:
+        _suggestion_cache.popitem(last=False)
+
+def _forget_cached_suggestions(prompt):
+    """Drop suggestions for a prompt that just received feedback, so the next request reflects it"""
+    prompt_key = prompt.lower().strip()
+    for key in [key for key in _suggestion_cache if key[0] == prompt_key]:
+        del _suggestion_cache[key]
 
 @app.post("/analyze")
 async def analyze(request: Request):
-    data = await request.json()
+    data = orjson.loads(await request.body())
     prompt = data.get("prompt", "")
     feature_type = data.get("feature_type", "basic")  # basic, premium
-    start_time = datetime.now()
+    start_time = time.monotonic()
 
     if not prompt:
         return {"suggestion": "Please enter what you'd like to draw!"}
@@ -2395,9 +3402,7 @@ async def analyze(request: Request):
     trial_start = user_info.get("trial_start_date")
     trial_active = False
     if trial_start:
-        trial_start_date = datetime.fromisoformat(trial_start)
-        days_since_trial = (datetime.now() - trial_start_date).days
-        trial_active = days_since_trial < 10
+        trial_active = time.time() < _trial_expiry(trial_start)
     else:
         # Auto-start trial on first premium feature use
         user_info["trial_start_date"] = datetime.now().isoformat()
@@ -2405,7 +3410,7 @@ async def analyze(request: Request):
         trial_active = True
 
     if feature_type == "premium" and not is_premium and not trial_active:
-        return {"suggestion": """🔒 <strong>Premium Feature</strong><br>
+        return FastJSONResponse({"suggestion": """🔒 <strong>Premium Feature</strong><br>
         This advanced AI feature requires premium access or trial usage.<br><br>
         ✨ <strong>Premium features include:</strong><br>
         • Advanced step-by-step tutorials<br>
@@ -2414,18 +3419,27 @@ async def analyze(request: Request):
         • Composition tips<br>
         • Professional techniques<br><br>
         🎯 <strong>Get access:</strong> Use a trial or upgrade to premium!""", 
-        "premium_required": True}
+        "premium_required": True}, status_code=402)
+
+    # The OpenAI messages depend on the prompt, the feature type and the user's skill level
+    suggestion_key = (prompt.lower().strip(), feature_type, _user_skill_level(user_info.get("total_uses", 0)))
+    cached = _cached_suggestion(suggestion_key)
+    if cached is not None:
+        _, suggestion, rating, body = cached
+        response_time = time.monotonic() - start_time
+        ai_training.collect_training_data(prompt, suggestion, rating, None, response_time, session_id=user_id)
+        return {**body, "response_time": response_time}
 
     try:
         # Intelligent Response Routing System
-        response_strategy = ai_training.determine_response_strategy(prompt, feature_type, user_info)
+        response_strategy = ai_training.determine_response_strategy(prompt, feature_type, user_info, is_premium=is_premium)
         
         if response_strategy["strategy"] == "training_only":
             # Use pure training data response
             suggestion = response_strategy["response"]
-            response_time = (datetime.now() - start_time).total_seconds()
+            response_time = time.monotonic() - start_time
             
-            ai_training.collect_training_data(prompt, suggestion, 5, None, response_time)
+            ai_training.collect_training_data(prompt, suggestion, 5, None, response_time, session_id=user_id)
             
             return {
                 "suggestion": suggestion + "<br><br>🎓 <em>Response from AI training dataset</em>",
@@ -2437,9 +3451,8 @@ async def analyze(request: Request):
             
         elif response_strategy["strategy"] == "openai_only":
             # Use pure OpenAI API response
-            from openai import OpenAI
-            client = OpenAI()
-            response = client.chat.completions.create(
+            client = _get_async_openai_client()
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": response_strategy["system_message"]},
@@ -2451,36 +3464,29 @@ async def analyze(request: Request):
 
             suggestion = response.choices[0].message.content.strip()
             api_manager.track_usage(success=True)
-            response_time = (datetime.now() - start_time).total_seconds()
+            response_time = time.monotonic() - start_time
             
-            ai_training.collect_training_data(prompt, suggestion, 3, None, response_time)
+            ai_training.collect_training_data(prompt, suggestion, 3, None, response_time, session_id=user_id)
             
-            return {
+            body = {
                 "suggestion": suggestion + "<br><br>🤖 <em>Response from OpenAI API</em>",
                 "feature_type": feature_type,
                 "response_time": response_time,
                 "from_openai": True,
                 "strategy_used": "openai_only"
             }
+            _cache_suggestion(suggestion_key, suggestion, 3, body)
+            return body
             
         elif response_strategy["strategy"] == "hybrid":
             # Combine training data and OpenAI response
             training_context = response_strategy["training_context"]
             
-            from openai import OpenAI
-            client = OpenAI()
-            
-            hybrid_prompt = f"""
-            User Request: {prompt}
+            client = _get_async_openai_client()
             
-            Relevant Training Data Context:
-            {training_context}
+            hybrid_prompt = HYBRID_PROMPT_TEMPLATE.substitute(prompt=prompt, training_context=training_context[:HYBRID_CONTEXT_LIMIT])
             
-            Instructions: Combine the training data insights with your knowledge to provide a comprehensive response.
-            Build upon the training examples while adding your own expertise.
-            """
-            
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": response_strategy["system_message"]},
@@ -2492,11 +3498,11 @@ async def analyze(request: Request):
 
             suggestion = response.choices[0].message.content.strip()
             api_manager.track_usage(success=True)
-            response_time = (datetime.now() - start_time).total_seconds()
+            response_time = time.monotonic() - start_time
             
-            ai_training.collect_training_data(prompt, suggestion, 4, None, response_time)
+            ai_training.collect_training_data(prompt, suggestion, 4, None, response_time, session_id=user_id)
             
-            return {
+            body = {
                 "suggestion": suggestion + "<br><br>🔄 <em>Hybrid response: Training data + OpenAI</em>",
                 "feature_type": feature_type,
                 "response_time": response_time,
@@ -2504,16 +3510,15 @@ async def analyze(request: Request):
                 "strategy_used": "hybrid",
                 "training_examples_used": len(response_strategy.get("training_examples", []))
             }
+            _cache_suggestion(suggestion_key, suggestion, 4, body)
+            return body
             
         # Fallback to basic system if routing fails
-        basic_system = """You are an expert drawing instructor and technical support specialist for a digital drawing application."""
-        
-        from openai import OpenAI
-        client = OpenAI()
-        response = client.chat.completions.create(
+        client = _get_async_openai_client()
+        response = await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
-                {"role": "system", "content": basic_system},
+                {"role": "system", "content": BASIC_SYSTEM_MESSAGE},
                 {"role": "user", "content": f"How do I draw a {prompt}?"}
             ],
             max_tokens=150,
@@ -2522,28 +3527,26 @@ async def analyze(request: Request):
 
         suggestion = response.choices[0].message.content.strip()
         api_manager.track_usage(success=True)
-        response_time = (datetime.now() - start_time).total_seconds()
+        response_time = time.monotonic() - start_time
         
-        ai_training.collect_training_data(prompt, suggestion, 3, None, response_time)
+        ai_training.collect_training_data(prompt, suggestion, 3, None, response_time, session_id=user_id)
 
-        return {
+        body = {
             "suggestion": suggestion + "<br><br>⚙️ <em>Fallback response</em>", 
             "feature_type": feature_type,
             "response_time": response_time,
             "strategy_used": "fallback"
         }
+        _cache_suggestion(suggestion_key, suggestion, 3, body)
+        return body
 
     except Exception as e:
         # Track failed API usage
         api_manager.track_usage(success=False)
         
         # Short fallback responses
-        if any(word in prompt.lower() for word in ['help', 'problem', 'not working', 'tool']):
-            fallback = f"""🔧 <strong>Quick Fix:</strong><br>
-            • Check tool is selected (blue highlight)<br>
-            • Verify brush size > 1<br>
-            • Click canvas first<br>
-            • Try refreshing page"""
+        if FALLBACK_HELP_PATTERN.search(prompt):
+            fallback = HELP_FALLBACK_SUGGESTION
         else:
             fallback = f"""🎨 <strong>Draw {prompt}:</strong><br>
             • Start with basic shapes<br>
@@ -2552,11 +3555,11 @@ async def analyze(request: Request):
             • Add colors with color picker"""
 
         # Keep fallback responses short
-        response_time = (datetime.now() - start_time).total_seconds()
+        response_time = time.monotonic() - start_time
         
         # Collect training data for fallback responses too
         ai_training.collect_training_data(
-            prompt, fallback, 2, "Fallback response used - API unavailable", response_time
+            prompt, fallback, 2, "Fallback response used - API unavailable", response_time, session_id=user_id
         )
 
         return {
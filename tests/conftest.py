@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Run against the JSON fallback storage and without OpenAI credentials
+os.environ.pop("DATABASE_URL", None)
+os.environ.pop("OPENAI_API_KEY", None)
+# The fallback files live in the working directory; keep import-time writes out of the repo
+os.chdir(tempfile.mkdtemp())
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Give every test its own fallback storage directory and empty request caches"""
+    monkeypatch.chdir(tmp_path)
+    main._user_data_cache.clear()
+    main._user_status_cache.clear()
+    yield
+    main._user_data_cache.clear()
+    main._user_status_cache.clear()
+
+
+@pytest.fixture
+def client():
+    """Client without startup/shutdown events, so background writers are not running"""
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def live_client():
+    """Client that runs the app's startup and shutdown events around the test"""
+    with TestClient(main.app) as test_client:
+        yield test_client
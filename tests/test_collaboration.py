@@ -0,0 +1,51 @@
+import json
+
+import main
+
+
+def test_binary_frames_are_relayed_unmodified(client):
+    compressed_stroke = b"x\x9c\xcbH\xcd\xc9\xc9\x07\x00\x06,\x02\x15"
+    png_chunk = b"\x89PNG\r\n\x1a\n"
+    with client.websocket_connect("/ws/binary-session") as websocket:
+        websocket.send_bytes(compressed_stroke)
+        websocket.send_bytes(png_chunk)
+        assert websocket.receive_bytes() == compressed_stroke
+        assert websocket.receive_bytes() == png_chunk
+
+
+def test_binary_frames_reach_other_peers(client):
+    with client.websocket_connect("/ws/shared-session") as sender, \
+            client.websocket_connect("/ws/shared-session") as receiver:
+        sender.send_bytes(b"\x00\x01\x02")
+        assert receiver.receive_bytes() == b"\x00\x01\x02"
+        assert sender.receive_bytes() == b"\x00\x01\x02"
+
+
+def test_text_messages_keep_one_message_per_frame_by_default(client):
+    with client.websocket_connect("/ws/text-session") as websocket:
+        assert websocket.accepted_subprotocol is None
+        websocket.send_text('{"x": 1}')
+        websocket.send_text("not json")
+        assert websocket.receive_text() == '{"x": 1}'
+        assert websocket.receive_text() == "not json"
+
+
+def test_batch_subprotocol_sends_text_as_json_arrays(client):
+    with client.websocket_connect("/ws/batched-session", subprotocols=[main.BATCH_SUBPROTOCOL]) as websocket:
+        assert websocket.accepted_subprotocol == main.BATCH_SUBPROTOCOL
+        for index in range(3):
+            websocket.send_text(json.dumps({"stroke": index}))
+        received = []
+        while len(received) < 3:
+            frame = json.loads(websocket.receive_text())
+            assert isinstance(frame, list)
+            received.extend(frame)
+        assert received == [{"stroke": 0}, {"stroke": 1}, {"stroke": 2}]
+
+
+def test_batch_subprotocol_still_relays_binary_unmodified(client):
+    with client.websocket_connect("/ws/mixed-session", subprotocols=[main.BATCH_SUBPROTOCOL]) as websocket:
+        websocket.send_text('{"stroke": 1}')
+        websocket.send_bytes(b"\x89PNG")
+        assert websocket.receive_text() == '[{"stroke": 1}]'
+        assert websocket.receive_bytes() == b"\x89PNG"
@@ -0,0 +1,44 @@
+import pytest
+
+import main
+
+HEADERS = {"user-agent": "etag-tester"}
+
+
+def test_unchanged_status_is_revalidated_with_304(client):
+    first = client.get("/user-status", headers=HEADERS)
+    etag = first.headers["etag"]
+    again = client.get("/user-status", headers={**HEADERS, "if-none-match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+
+def test_changed_status_gets_a_new_body(client):
+    etag = client.get("/user-status", headers=HEADERS).headers["etag"]
+    client.post("/start-trial", headers=HEADERS)
+    response = client.get("/user-status", headers={**HEADERS, "if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_gallery_is_revalidated_until_a_drawing_is_saved(client):
+    etag = client.get("/gallery", headers=HEADERS).headers["etag"]
+    assert client.get("/gallery", headers={**HEADERS, "if-none-match": etag}).status_code == 304
+    client.post("/save-drawing", headers=HEADERS, json={"drawing_data": "data:x"})
+    assert client.get("/gallery", headers={**HEADERS, "if-none-match": etag}).status_code == 200
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ('"xyz" ,  "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+    ('"abcd"', False),
+    ('"xabc"', False),
+    ("", False),
+])
+def test_if_none_match_parsing(header, matches):
+    assert main._etag_matches(header, '"abc"') is matches
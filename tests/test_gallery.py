@@ -0,0 +1,63 @@
+import main
+
+HEADERS = {"user-agent": "gallery-tester"}
+
+
+def save_drawings(client, count):
+    return [
+        client.post("/save-drawing", headers=HEADERS, json={"title": f"Drawing {i}", "drawing_data": f"data:{i}"}).json()["drawing_id"]
+        for i in range(count)
+    ]
+
+
+def test_gallery_pages_metadata_without_image_data(client):
+    ids = save_drawings(client, 5)
+    page = client.get("/gallery", headers=HEADERS, params={"offset": 1, "limit": 2}).json()
+    assert page["total"] == 5
+    assert page["offset"] == 1
+    assert [drawing["id"] for drawing in page["drawings"]] == ids[1:3]
+    assert all("data" not in drawing for drawing in page["drawings"])
+
+
+def test_gallery_includes_image_data_on_request(client):
+    save_drawings(client, 3)
+    page = client.get("/gallery", headers=HEADERS, params={"include_data": True}).json()
+    assert [drawing["data"] for drawing in page["drawings"]] == ["data:0", "data:1", "data:2"]
+
+
+def test_single_drawing_is_served_with_its_data(client):
+    first, second = save_drawings(client, 2)
+    drawing = client.get(f"/gallery/{second}", headers=HEADERS).json()
+    assert (drawing["title"], drawing["data"]) == ("Drawing 1", "data:1")
+    assert client.get("/gallery/unknown", headers=HEADERS).status_code == 404
+
+
+def test_drawings_of_other_users_are_not_served(client):
+    (drawing_id,) = save_drawings(client, 1)
+    assert main.db_manager.get_drawing_data("someone-else", [drawing_id]) == {}
+
+
+def test_truncated_store_lines_are_skipped(client):
+    (first,) = save_drawings(client, 1)
+    with open("drawings.jsonl", "a") as f:
+        f.write('{"id": "cut-sho')  # A save interrupted mid-write
+    second = client.post("/save-drawing", headers=HEADERS, json={"title": "After", "drawing_data": "data:after"}).json()["drawing_id"]
+    page = client.get("/gallery", headers=HEADERS, params={"include_data": True})
+    assert page.status_code == 200
+    assert [drawing["data"] for drawing in page.json()["drawings"]] == ["data:0", "data:after"]
+
+
+def test_gallery_is_listed_from_the_drawings_table_when_there_is_one(client, monkeypatch):
+    listed = [{"id": "d1", "title": "From the table", "created": "2024-01-01T00:00:00"}]
+    monkeypatch.setattr(main.db_manager, "get_drawings", lambda user_id: listed)
+    monkeypatch.setattr(main.db_manager, "get_drawing_data", lambda user_id, ids: {"d1": "data:d1"})
+    page = client.get("/gallery", headers=HEADERS).json()
+    assert (page["total"], page["drawings"]) == (1, listed)
+    assert client.get("/gallery/d1", headers=HEADERS).json()["data"] == "data:d1"
+
+
+def test_failed_drawing_save_is_reported(client, monkeypatch):
+    monkeypatch.setattr(main.db_manager, "save_drawing", lambda *args: False)
+    response = client.post("/save-drawing", headers=HEADERS, json={"drawing_data": "data:x"})
+    assert response.status_code == 500
+    assert client.get("/gallery", headers=HEADERS).json()["total"] == 0
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+FEEDBACK = {"prompt": "draw a cat", "response": "Use the brush tool", "rating": 5}
+
+
+def recorded_batches(monkeypatch):
+    batches = []
+    monkeypatch.setattr(main.db_manager, "save_ai_training_data_many",
+                        lambda rows: batches.append(list(rows)) or True, raising=False)
+    return batches
+
+
+def test_feedback_is_persisted_inline_without_the_flush_task(client, monkeypatch):
+    batches = recorded_batches(monkeypatch)
+    client.post("/submit-feedback", json=FEEDBACK)
+    assert batches == [[("system", "draw a cat", "Use the brush tool", 5, None)]]
+
+
+def test_rows_queued_together_are_written_as_one_batch(monkeypatch):
+    batches = recorded_batches(monkeypatch)
+    training = main.AITrainingSystem()
+
+    async def feedback_burst():
+        training.start_persistence()
+        for rating in range(1, 4):
+            training.collect_training_data("draw a cat", "Use the brush tool", rating)
+        assert batches == []  # Nothing is written on the request path
+        await asyncio.sleep(0.1)
+        await training.stop_persistence()
+
+    asyncio.run(feedback_burst())
+    assert [[row[3] for row in batch] for batch in batches] == [[1, 2, 3]]
+
+
+def test_queued_feedback_is_flushed_on_shutdown(monkeypatch):
+    batches = recorded_batches(monkeypatch)
+    training = main.AITrainingSystem()
+
+    async def stop_before_the_flush():
+        training.start_persistence()
+        training.collect_training_data("draw a cat", "Use the brush tool", 4)
+        await training.stop_persistence()
+
+    asyncio.run(stop_before_the_flush())
+    assert [[row[3] for row in batch] for batch in batches] == [[4]]
+
+
+def test_shutdown_waits_for_the_batch_being_written(monkeypatch):
+    batches = []
+
+    def slow_save(rows):
+        time.sleep(0.2)
+        batches.append(list(rows))
+        return True
+
+    monkeypatch.setattr(main.db_manager, "save_ai_training_data_many", slow_save, raising=False)
+    training = main.AITrainingSystem()
+
+    async def stop_during_a_write():
+        training.start_persistence()
+        training.collect_training_data("draw a cat", "Use the brush tool", 4)
+        await asyncio.sleep(0.05)  # The flush task is now inside the slow write
+        await training.stop_persistence()
+        return list(batches)
+
+    assert asyncio.run(stop_during_a_write()) == [[("system", "draw a cat", "Use the brush tool", 4, None)]]
+
+
+def test_persistence_survives_a_restart(monkeypatch):
+    batches = recorded_batches(monkeypatch)
+    for rating in (1, 2):
+        with TestClient(main.app) as client:
+            client.post("/submit-feedback", json={**FEEDBACK, "rating": rating})
+    assert [row[3] for batch in batches for row in batch] == [1, 2]
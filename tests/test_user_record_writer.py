@@ -0,0 +1,147 @@
+import json
+import threading
+
+import main
+
+HEADERS = {"user-agent": "writer-tester"}
+
+
+def stored_user(user_id="writer-tester"):
+    try:
+        with open("user_data.json") as f:
+            return json.load(f).get(user_id)
+    except FileNotFoundError:
+        return None
+
+
+def test_saves_write_through_without_a_running_writer(client):
+    client.post("/start-trial", headers=HEADERS)
+    assert stored_user()["trial_start_date"] is not None
+
+
+def test_saves_are_deferred_and_flushed_on_shutdown(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    # Keep the periodic flush from firing during the test
+    monkeypatch.setattr(main, "USER_WRITE_INTERVAL", 3600)
+    with TestClient(main.app) as client:
+        for _ in range(3):
+            client.post("/analyze", headers=HEADERS, json={"prompt": "my brush tool is not working"})
+        assert stored_user() is None
+        # Reads see the queued record before storage does
+        assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 3
+    assert stored_user()["total_uses"] == 3
+
+
+def test_payment_saves_reach_storage_immediately(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "USER_WRITE_INTERVAL", 3600)
+    with TestClient(main.app) as client:
+        client.post("/analyze", headers=HEADERS, json={"prompt": "my brush tool is not working"})
+        client.post("/activate-premium", headers=HEADERS)
+        stored = stored_user()
+        assert stored["premium"] is True
+        assert stored["total_uses"] == 1
+
+
+class FakeStorage:
+    def __init__(self):
+        self.records = {}
+
+    def get_user_data(self, user_id):
+        return dict(self.records.get(user_id, {"total_uses": 0}))
+
+    def save_user_data(self, user_id, user_data):
+        self.records[user_id] = user_data
+        return True
+
+    def save_user_data_many(self, users):
+        self.records.update(users)
+        return True
+
+
+def running_writer(monkeypatch, storage):
+    writer = main.UserRecordWriter()
+    writer._task = object()  # Behave as if the flush task were running
+    monkeypatch.setattr(main, "user_record_writer", writer)
+    for name in ("get_user_data", "save_user_data", "save_user_data_many"):
+        monkeypatch.setattr(main.db_manager, name, getattr(storage, name))
+    return writer
+
+
+def take_batch(writer):
+    """Swap the pending records into the in-flight batch, as the flush loop does"""
+    with writer._lock:
+        batch, writer.pending = writer.pending, {}
+        writer.writing = batch
+    return batch
+
+
+def test_flushed_save_is_not_overwritten_by_an_older_batch(monkeypatch):
+    storage = FakeStorage()
+    writer = running_writer(monkeypatch, storage)
+    writer.save("u", {"total_uses": 1})
+    batch = take_batch(writer)
+
+    writer.save("u", {"total_uses": 2}, flush=True)
+    writer._write(batch)
+
+    assert storage.records["u"] == {"total_uses": 2}
+
+
+def test_reads_during_a_batch_write_never_see_the_previous_record(monkeypatch):
+    storage = FakeStorage()
+    storage.records["u"] = {"total_uses": 1}
+    writer = running_writer(monkeypatch, storage)
+    main._load_user_session("u")  # Caches the stored record
+
+    writer.save("u", {"total_uses": 2})
+    batch = take_batch(writer)
+    seen = []
+    forget = main._forget_user_record
+
+    def forget_while_reading(user_id):
+        # A concurrent request loads the user at the moment the batch is being retired
+        reader = threading.Thread(target=lambda: seen.append(main._load_user_session(user_id)[1]))
+        reader.start()
+        reader.join(timeout=0.05)
+        forget(user_id)
+        monkeypatch.setattr(main, "_forget_user_record", forget)
+        forget_while_reading.reader = reader
+
+    monkeypatch.setattr(main, "_forget_user_record", forget_while_reading)
+    writer._write(batch)
+    forget_while_reading.reader.join()
+
+    assert seen == [{"total_uses": 2}]
+    assert main._load_user_session("u")[1] == {"total_uses": 2}
+
+
+def test_shutdown_waits_for_the_batch_being_written(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    storage = FakeStorage()
+    writes, active, overlapped = [], [], []
+    started = threading.Event()
+
+    def slow_save_many(users):
+        overlapped.append(bool(active))
+        active.append(1)
+        started.set()
+        main.time.sleep(0.2)
+        storage.save_user_data_many(users)
+        writes.append(sorted(users))
+        active.pop()
+        return True
+
+    monkeypatch.setattr(main, "USER_WRITE_INTERVAL", 0.01)
+    monkeypatch.setattr(main.db_manager, "save_user_data_many", slow_save_many)
+    with TestClient(main.app):
+        main.user_record_writer.save("a", {"total_uses": 1})
+        assert started.wait(1)
+        main.user_record_writer.save("b", {"total_uses": 1})
+
+    assert overlapped == [False, False]
+    assert writes == [["a"], ["b"]]
+    assert set(storage.records) == {"a", "b"}
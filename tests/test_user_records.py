@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+
+import main
+
+
+def test_loaded_records_are_cached_and_copied(monkeypatch):
+    loads = []
+
+    def get_user_data(user_id):
+        loads.append(user_id)
+        return {"total_uses": 3, "saved_drawings": []}
+
+    monkeypatch.setattr(main.db_manager, "get_user_data", get_user_data)
+    _, first = main._load_user_session("cached-user")
+    first["total_uses"] = 99
+    _, second = main._load_user_session("cached-user")
+    assert loads == ["cached-user"]
+    assert second["total_uses"] == 3
+
+
+class InterleavingCache(OrderedDict):
+    """Cache whose lookups let another thread invalidate the key before the caller continues"""
+
+    def __init__(self, invalidate):
+        super().__init__()
+        self.invalidate = invalidate
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        other = threading.Thread(target=self.invalidate, args=(key,))
+        other.start()
+        # Holding the cache lock keeps the invalidation waiting until the lookup is done
+        other.join(timeout=0.05)
+        return value
+
+
+def test_invalidation_cannot_interleave_with_a_cache_hit(monkeypatch):
+    cache = InterleavingCache(main._forget_user_record)
+    cache["racing-user"] = (main.time.monotonic(), {"total_uses": 5})
+    monkeypatch.setattr(main, "_user_data_cache", cache)
+    user_id, record = main._load_user_session("racing-user")
+    assert record == {"total_uses": 5}
@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+
+import main
+
+HEADERS = {"user-agent": "status-tester"}
+
+
+def test_status_is_served_from_cache_until_the_record_is_saved(client):
+    assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 0
+
+    # Written behind the app's back: the cached status is still served
+    main.db_manager.save_user_data("status-tester", {"total_uses": 4})
+    main._forget_user_record("status-tester")
+    assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 0
+
+    main.update_user_data("status-tester", {"total_uses": 5})
+    assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 5
+
+
+def test_status_computed_across_a_save_is_not_cached(client, monkeypatch):
+    load_session = main.get_user_session
+
+    def session_saved_meanwhile(request):
+        user_id, user_info = load_session(request)
+        main.update_user_data(user_id, {**user_info, "total_uses": 7})
+        monkeypatch.setattr(main, "get_user_session", load_session)
+        return user_id, user_info
+
+    monkeypatch.setattr(main, "get_user_session", session_saved_meanwhile)
+    assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 0
+    assert client.get("/user-status", headers=HEADERS).json()["total_uses"] == 7
+
+
+class InterleavingCache(OrderedDict):
+    """Cache whose lookups let another thread invalidate the key before the caller continues"""
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        other = threading.Thread(target=main._forget_user_status, args=(key,))
+        other.start()
+        other.join(timeout=0.05)
+        return value
+
+
+def test_invalidation_cannot_interleave_with_a_status_cache_hit(client, monkeypatch):
+    body, etag = main._render_with_etag({"total_uses": 1})
+    cache = InterleavingCache()
+    cache["status-tester"] = (main.time.monotonic(), body, etag)
+    monkeypatch.setattr(main, "_user_status_cache", cache)
+    response = client.get("/user-status", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"total_uses": 1}